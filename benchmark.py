@@ -0,0 +1,80 @@
+import os
+# Benchmarks run offline by default: LLM calls are served from recorded cassettes
+# (see llm_backends.py). Export LLM_BACKEND=gemini to measure against the real API.
+os.environ.setdefault("LLM_BACKEND", "replay")
+
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from termcolor import colored
+
+from evaluator import TEST_CASES
+from instrumentation import PerfRecorder, load_workload, write_report
+from langgraph_agent import run_graph_agent, run_legacy_agent, warm
+
+AGENTS = {"graph": run_graph_agent, "legacy": run_legacy_agent}
+
+
+def load_questions(path=None):
+    """Questions from a JSONL workload (see instrumentation.load_workload) or evaluator.TEST_CASES."""
+    if not path:
+        return [(test["name"], test["question"]) for test in TEST_CASES]
+    return load_workload(path)
+
+
+def run_agent_benchmark(agent, questions, iterations=1, concurrency=1):
+    """Answer every question `iterations` times; returns (PerfRecorder, wall seconds, errors)."""
+    run = AGENTS[agent]
+    recorder = PerfRecorder(label=f"{agent} x{iterations} c{concurrency}")
+    workload = [item for _ in range(iterations) for item in questions]
+    errors = []
+
+    def _answer(item):
+        name, question = item
+        with recorder.trace(name) as trace:
+            try:
+                run(question, callbacks=[trace])
+            except Exception as e:
+                errors.append((name, e))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(_answer, workload))
+    return recorder, time.perf_counter() - started, errors
+
+
+def print_summary(agent, recorder, wall, errors):
+    report = recorder.report()
+    total = report["stages"].get("total", {})
+    count = report["totals"]["questions"]
+    print(colored(f"\n📈 {agent.upper()}: {count} questions in {wall:.2f}s "
+                  f"({count / wall if wall else 0:.2f} q/s)", "cyan", attrs=["bold"]))
+    if total:
+        print(f"   end-to-end p50 {total['p50_s']:.3f}s  p95 {total['p95_s']:.3f}s  p99 {total['p99_s']:.3f}s")
+    for stage, row in report["stages"].items():
+        if stage != "total":
+            print(f"   {stage:<32} n={row['count']:<4} p50 {row['p50_s']:.4f}s  p95 {row['p95_s']:.4f}s")
+    if errors:
+        print(colored(f"   {len(errors)} errors, first: {errors[0][0]}: {errors[0][1]}", "red"))
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="End-to-end throughput benchmark for the graph and legacy agents.")
+    parser.add_argument("--agent", choices=["graph", "legacy", "both"], default="both")
+    parser.add_argument("--questions", help="JSONL workload (default: evaluator.TEST_CASES)")
+    parser.add_argument("--iterations", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--report", help="write REPORT_<agent>.json/.csv for instrumentation.py comparisons")
+    args = parser.parse_args()
+
+    print(f"🤖 LLM backend: {os.environ['LLM_BACKEND']}")
+    warm()  # index builds and model loading are not part of the measurement
+    questions = load_questions(args.questions)
+    for agent in (["graph", "legacy"] if args.agent == "both" else [args.agent]):
+        recorder, wall, errors = run_agent_benchmark(agent, questions, args.iterations, args.concurrency)
+        report = print_summary(agent, recorder, wall, errors)
+        report["wall_s"] = wall
+        report["throughput_qps"] = len(recorder.traces) / wall if wall else 0.0
+        if args.report:
+            print(f"📝 {write_report(report, f'{args.report}_{agent}')}")
@@ -0,0 +1,95 @@
+import json
+import os
+import re
+from typing import NamedTuple, Optional
+
+from config import CATALOG_PATH, FILES
+
+
+class Filing(NamedTuple):
+    company: str
+    file: str               # PDF name inside DATA_FOLDER
+    form: str = "10-K"
+    year: Optional[int] = None
+
+    @property
+    def id(self):
+        return re.sub(r"[^a-z0-9]+", "-", f"{self.company}-{self.form}-{self.year or 'na'}".lower()).strip("-")
+
+    def metadata(self):
+        """Fields stamped on every chunk of this filing (Chroma metadata values cannot be None)."""
+        metadata = {"company": self.company, "form": self.form, "filing": self.id}
+        if self.year is not None:
+            metadata["year"] = self.year
+        return metadata
+
+
+class AliasMatcher:
+    """Finds the companies a question names, by key or by any catalog alias, in one regex scan."""
+
+    def __init__(self, companies, aliases=None):
+        self.companies = list(companies)
+        self._alias_to_company = {}
+        for company in self.companies:
+            for alias in [company, *(aliases or {}).get(company, [])]:
+                self._alias_to_company[alias.lower()] = company
+        names = sorted(self._alias_to_company, key=len, reverse=True)
+        self._pattern = re.compile(r"\b(" + "|".join(re.escape(n) for n in names) + r")(?:'?s)?\b", re.IGNORECASE)
+
+    def matches(self, question):
+        """(company, alias as written) for every mention, in question order."""
+        return [(self._alias_to_company[m.lower()], m) for m in self._pattern.findall(question)]
+
+    def mentioned(self, question):
+        """Companies named in the question, in catalog order."""
+        found = {company for company, _ in self.matches(question)}
+        return [c for c in self.companies if c in found]
+
+
+class Catalog:
+    """Which filings exist and how companies are referred to.
+
+    Read from a JSON file so adding an issuer or a fiscal year is a data change:
+
+        {"companies": {"tesla": {"name": "Tesla", "aliases": ["tsla"], "profile": "..."}},
+         "filings": [{"company": "tesla", "form": "10-K", "year": 2024, "file": "tsla-20241231-gen.pdf"}]}
+
+    Without a catalog file, config.FILES (company -> PDF) is used.
+    """
+
+    def __init__(self, filings, companies=None):
+        self.filings = list(filings)
+        self.info = dict(companies or {})
+        self.companies = list(dict.fromkeys(f.company for f in self.filings))
+
+    @classmethod
+    def from_files(cls, files):
+        return cls([Filing(company, file) for company, file in files.items()])
+
+    @classmethod
+    def load(cls, path=CATALOG_PATH):
+        if not path or not os.path.exists(path):
+            return cls.from_files(FILES)
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        filings = [Filing(entry["company"].lower(), entry["file"], entry.get("form", "10-K"), entry.get("year"))
+                   for entry in data.get("filings", [])]
+        return cls(filings, {key.lower(): value for key, value in data.get("companies", {}).items()})
+
+    def filings_for(self, company):
+        """Filings of `company`, oldest first."""
+        return sorted((f for f in self.filings if f.company == company), key=lambda f: f.year or 0)
+
+    def latest(self, company):
+        filings = self.filings_for(company)
+        return filings[-1] if filings else None
+
+    def name(self, company):
+        return self.info.get(company, {}).get("name") or company.capitalize()
+
+    def aliases(self):
+        return {company: self.info.get(company, {}).get("aliases", []) for company in self.companies}
+
+    def profiles(self):
+        return {company: self.info[company]["profile"] for company in self.companies
+                if self.info.get(company, {}).get("profile")}
@@ -0,0 +1,172 @@
+import re
+
+from config import CONTEXT_MIN_PASSAGE_TOKENS, CONTEXT_TOKEN_BUDGET, RRF_K
+
+
+# Retrieved chunks (chunk_size=2000, chunk_overlap=400) from the same page usually
+# overlap, so they are stitched back together by `start_index` before being packed
+# into a fixed token budget. Token counts use the same ~4 characters/token estimate
+# as the rate limiter; that is close enough for budgeting Gemini prompts.
+WHITESPACE = re.compile(r"\s+")
+ADJACENT_GAP = 2  # the splitter strips whitespace between chunks, so "adjacent" allows a small gap
+
+
+def estimate_tokens(text):
+    return len(text) // 4 + 1
+
+
+def _normalized(text):
+    return WHITESPACE.sub(" ", text).strip().lower()
+
+
+class Passage:
+    """A contiguous span of one page built from one or more retrieved chunks."""
+
+    def __init__(self, company, doc, rank):
+        self.company = company
+        self.page = doc.metadata.get("page")
+        self.source = doc.metadata.get("source")
+        self.start = doc.metadata.get("start_index")
+        self.form = doc.metadata.get("form", "10-K")
+        self.year = doc.metadata.get("year")
+        self.text = doc.page_content
+        self.score = 1.0 / (RRF_K + rank)
+
+    @property
+    def end(self):
+        return None if self.start is None else self.start + len(self.text)
+
+    def absorb(self, other):
+        """Append `other` (same page, starting near or before our end) without repeating the overlap."""
+        overlap = self.end - other.start
+        self.text += other.text[overlap:] if overlap >= 0 else " " + other.text
+        self.score += other.score
+
+    def tag(self):
+        label = f"{self.company.capitalize()} {self.form}" + (f" FY{self.year}" if self.year else "")
+        if self.page is not None:
+            label += f", page {self.page + 1}"
+        return f"[Source: {label}]"
+
+
+def merge_passages(company, docs):
+    """Merge overlapping/adjacent chunks of the same page and drop duplicated text.
+
+    `docs` are in retrieval order; each passage scores the reciprocal ranks of the
+    chunks it contains, so a region hit by several chunks ranks higher.
+    """
+    passages = [Passage(company, doc, rank) for rank, doc in enumerate(docs)]
+    merged = []
+    positioned = sorted((p for p in passages if p.start is not None and p.page is not None),
+                        key=lambda p: (p.source or "", p.page, p.start))
+    for passage in positioned:
+        last = merged[-1] if merged else None
+        if last and (last.source, last.page) == (passage.source, passage.page) and passage.start <= last.end + ADJACENT_GAP:
+            if passage.end > last.end:
+                last.absorb(passage)
+            else:
+                last.score += passage.score  # fully contained
+        else:
+            merged.append(passage)
+    loose = [p for p in passages if p.start is None or p.page is None]
+
+    unique, seen = [], []
+    for passage in merged + loose:
+        text = _normalized(passage.text)
+        duplicate = next((u for u, t in zip(unique, seen) if text in t), None)
+        if duplicate is not None:
+            duplicate.score += passage.score
+            continue
+        unique.append(passage)
+        seen.append(text)
+    return unique
+
+
+def _truncate(text, max_tokens):
+    """Cut `text` to about `max_tokens`, preferring a line or sentence boundary."""
+    limit = max_tokens * 4
+    if len(text) <= limit:
+        return text
+    cut = text[:limit]
+    boundary = max(cut.rfind("\n"), cut.rfind(". "))
+    if boundary > limit // 2:
+        cut = cut[:boundary + 1]
+    return cut.rstrip() + " ..."
+
+
+def _cost(passage):
+    return estimate_tokens(passage.tag()) + estimate_tokens(passage.text)
+
+
+def _fill(candidates, budget, min_tokens, chosen):
+    """Append `candidates` (best first) to `chosen` while they fit in `budget` tokens.
+
+    The first one that no longer fits is truncated if at least `min_tokens` remain, which
+    ends the fill; otherwise smaller passages may still fill the gap. Returns the tokens used.
+    """
+    used = 0
+    for passage in candidates:
+        cost = _cost(passage)
+        if used + cost <= budget:
+            chosen.append(passage)
+            used += cost
+            continue
+        remaining = budget - used - estimate_tokens(passage.tag())
+        if remaining >= min_tokens:
+            passage.text = _truncate(passage.text, remaining)
+            chosen.append(passage)
+            used += _cost(passage)
+            break
+    return used
+
+
+def _allot(demands, budget):
+    """Split `budget` fairly over {company: tokens wanted}: nobody gets more than they want and
+    what a small demand leaves unused is shared among the rest (max-min fair)."""
+    allotted, pending, left = {}, dict(demands), budget
+    while pending:
+        share = left // len(pending)
+        satisfied = {company: demand for company, demand in pending.items() if demand <= share}
+        if not satisfied:
+            allotted.update((company, share) for company in pending)
+            break
+        for company, demand in satisfied.items():
+            allotted[company] = demand
+            left -= demand
+            del pending[company]
+    return allotted
+
+
+def pack_context(results, budget=CONTEXT_TOKEN_BUDGET, min_tokens=CONTEXT_MIN_PASSAGE_TOKENS):
+    """Build the prompt context from {company: docs} within `budget` tokens.
+
+    The budget is first split fairly between the companies with passages and each
+    company's share is filled with its own best passages, so one company whose merged
+    passages score high cannot crowd the others out of a comparison. Whatever is left
+    then goes to the remaining passages of all companies, ranked together by score.
+    The chosen passages are laid out grouped by company, in page order, each with its
+    source tag. Returns (context, stats).
+    """
+    passages = [p for company, docs in results.items() for p in merge_passages(company, docs)]
+    chunks = sum(len(docs) for docs in results.values())
+    raw_tokens = sum(estimate_tokens(d.page_content) for docs in results.values() for d in docs)
+
+    ranked = sorted(passages, key=lambda p: p.score, reverse=True)
+    if budget is None:
+        chosen = ranked
+    else:
+        demands = {}
+        for passage in passages:
+            demands[passage.company] = demands.get(passage.company, 0) + _cost(passage)
+        chosen, used = [], 0
+        for company, share in _allot(demands, budget).items():
+            used += _fill([p for p in ranked if p.company == company], share, min_tokens, chosen)
+        taken = {id(p) for p in chosen}
+        _fill([p for p in ranked if id(p) not in taken], budget - used, min_tokens, chosen)
+
+    order = list(results)
+    chosen.sort(key=lambda p: (order.index(p.company), p.page if p.page is not None else -1, p.start or 0))
+    context = "\n\n".join(f"{p.tag()}\n{p.text.strip()}" for p in chosen)
+    stats = {"chunks": chunks, "passages": len(passages), "packed": len(chosen),
+             "raw_tokens": raw_tokens, "tokens": estimate_tokens(context) if context else 0}
+    return context, stats
@@ -0,0 +1,152 @@
+import os
+import queue
+import re
+import threading
+import time
+from concurrent.futures import Future
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+class OnnxEmbeddings(Embeddings):
+    """Sentence-transformers model run with ONNX Runtime instead of PyTorch.
+
+    Uses the model's ONNX export (`onnx/model.onnx` in the Hub repo, or a local
+    directory holding `model.onnx` + `tokenizer.json`) and the Rust `tokenizers`
+    package, so torch is never imported. With `quantize=True` the weights are
+    dynamically quantized to int8 once and the result is kept under `cache_dir`.
+    Vectors are mean-pooled token embeddings, like HuggingFaceEmbeddings with
+    default settings (not normalized).
+    """
+
+    def __init__(self, model_name, cache_dir="embedding_cache", quantize=True, local_path=None, max_length=128,
+                 batch_size=64, threads=None):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        self.model_name = model_name
+        self.batch_size = batch_size
+        model_path, tokenizer_path = self._files(model_name, local_path)
+        if quantize:
+            model_dir = os.path.join(cache_dir, "onnx", re.sub(r"[^A-Za-z0-9_.-]+", "__", model_name))
+            model_path = self._quantized(model_path, model_dir)
+
+        self.tokenizer = Tokenizer.from_file(tokenizer_path)
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+        options = onnxruntime.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    @staticmethod
+    def _files(model_name, local_path):
+        if local_path:
+            return os.path.join(local_path, "model.onnx"), os.path.join(local_path, "tokenizer.json")
+        from huggingface_hub import hf_hub_download
+
+        return hf_hub_download(model_name, "onnx/model.onnx"), hf_hub_download(model_name, "tokenizer.json")
+
+    @staticmethod
+    def _quantized(model_path, cache_dir):
+        quantized_path = os.path.join(cache_dir, "model_int8.onnx")
+        if not os.path.exists(quantized_path):
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            print(f"🔨 Quantizing {os.path.basename(model_path)} to int8 (This happens once)...")
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = quantized_path + ".tmp"
+            quantize_dynamic(model_path, tmp_path, weight_type=QuantType.QInt8)
+            os.replace(tmp_path, quantized_path)
+        return quantized_path
+
+    def _embed(self, texts):
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        inputs = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            inputs["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+        token_embeddings = self.session.run(None, inputs)[0]
+        mask = attention_mask[:, :, None].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled.tolist()
+
+    def embed_documents(self, texts):
+        texts = [text.replace("\n", " ") for text in texts]
+        # Sorting by length keeps padding (wasted compute) low inside each batch
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors = [None] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            for i, vector in zip(batch, self._embed([texts[i] for i in batch])):
+                vectors[i] = vector
+        return vectors
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class MicroBatchingEmbeddings(Embeddings):
+    """Embeds concurrent `embed_query` calls together.
+
+    The first query waits up to `max_wait_ms` for others to arrive (up to
+    `max_batch`), then one `embed_documents` call serves them all. Under load this
+    turns many small model calls into a few batched ones; a lone query pays at most
+    `max_wait_ms`. Document embedding is passed straight through.
+    """
+
+    def __init__(self, embeddings, max_batch=32, max_wait_ms=2.0):
+        self.embeddings = embeddings
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.queries = 0
+
+    def _start(self):
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="query-embedding-batcher", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            pending = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(pending) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    pending.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            texts = list(dict.fromkeys(text for text, _ in pending))
+            try:
+                vectors = dict(zip(texts, self.embeddings.embed_documents(texts)))
+            except Exception as e:
+                for _, future in pending:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.queries += len(pending)
+            for text, future in pending:
+                future.set_result(list(vectors[text]))
+
+    def embed_documents(self, texts):
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        if self._worker is None:
+            self._start()
+        future = Future()
+        self._queue.put((text, future))
+        return future.result()
+
+    def stats(self):
+        return {"queries": self.queries, "batches": self.batches,
+                "mean_batch": self.queries / self.batches if self.batches else 0.0}
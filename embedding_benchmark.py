@@ -0,0 +1,116 @@
+import argparse
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+import numpy as np
+from termcolor import colored
+
+from catalog import Catalog
+from config import DATA_FOLDER, LOCAL_EMBEDDING_MODEL, EMBEDDING_CACHE_DIR, EMBEDDING_ONNX_PATH, RETRIEVER_K
+from embedding_backends import MicroBatchingEmbeddings, OnnxEmbeddings
+from evaluator import TEST_CASES
+from indexing import iter_splits
+from instrumentation import percentile
+
+
+def load_backend(name):
+    if name == "torch":
+        from langchain_huggingface import HuggingFaceEmbeddings
+        return HuggingFaceEmbeddings(model_name=LOCAL_EMBEDDING_MODEL)
+    return OnnxEmbeddings(LOCAL_EMBEDDING_MODEL, cache_dir=EMBEDDING_CACHE_DIR or "embedding_cache",
+                          quantize=name == "onnx-int8", local_path=EMBEDDING_ONNX_PATH or None)
+
+
+def sample_texts(count, seed=0):
+    """Chunks of the first available filing, plus evaluator questions and chunk-derived queries."""
+    catalog = Catalog.load()
+    path = next((os.path.join(DATA_FOLDER, f.file) for f in catalog.filings
+                 if os.path.exists(os.path.join(DATA_FOLDER, f.file))), None)
+    if path is None:
+        raise SystemExit("No filing PDF found in the data folder.")
+    chunks = [doc.page_content for doc in islice(iter_splits(path), count)]
+    rng = random.Random(seed)
+    queries = [test["question"] for test in TEST_CASES]
+    queries += [text.strip().split(". ")[0][:200] for text in rng.sample(chunks, min(len(chunks), 100))]
+    return chunks, queries
+
+
+def unit(vectors):
+    matrix = np.asarray(vectors, dtype=np.float32)
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+
+def query_load(embeddings, queries, concurrency):
+    """Queries per second when `concurrency` callers embed distinct questions at once."""
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(embeddings.embed_query, queries))
+    return len(queries) / (time.perf_counter() - started)
+
+
+def benchmark_backend(name, chunks, queries, concurrency):
+    started = time.perf_counter()
+    embeddings = load_backend(name)
+    load_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    doc_vectors = embeddings.embed_documents(chunks)
+    docs_per_s = len(chunks) / (time.perf_counter() - started)
+
+    latencies, query_vectors = [], []
+    for query in queries:
+        started = time.perf_counter()
+        query_vectors.append(embeddings.embed_query(query))
+        latencies.append(time.perf_counter() - started)
+
+    # Distinct texts per run so the batcher cannot just deduplicate them
+    plain_qps = query_load(embeddings, [f"{q} ({i})" for i, q in enumerate(queries)], concurrency)
+    batcher = MicroBatchingEmbeddings(embeddings)
+    batched_qps = query_load(batcher, [f"{q} [{i}]" for i, q in enumerate(queries)], concurrency)
+    return {
+        "name": name, "load_s": load_s, "docs_per_s": docs_per_s,
+        "query_p50_ms": percentile(latencies, 50) * 1000, "query_p95_ms": percentile(latencies, 95) * 1000,
+        "qps": plain_qps, "batched_qps": batched_qps, "mean_batch": batcher.stats()["mean_batch"],
+        "docs": unit(doc_vectors), "queries": unit(query_vectors),
+    }
+
+
+def quality(result, reference, k):
+    """Mean cosine to the reference vectors, and recall@k of the reference's top-k chunks."""
+    cosine = float(np.mean(np.sum(result["docs"] * reference["docs"], axis=1)))
+    ours = np.argsort(-(result["queries"] @ result["docs"].T), axis=1)[:, :k]
+    theirs = np.argsort(-(reference["queries"] @ reference["docs"].T), axis=1)[:, :k]
+    recall = float(np.mean([len(set(a) & set(b)) / k for a, b in zip(ours, theirs)]))
+    return cosine, recall
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare embedding backends on speed and retrieval agreement.")
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx", "onnx-int8"],
+                        help="the first one is the quality reference")
+    parser.add_argument("--chunks", type=int, default=256)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--k", type=int, default=RETRIEVER_K)
+    args = parser.parse_args()
+
+    chunks, queries = sample_texts(args.chunks)
+    results = []
+    for name in args.backends:
+        try:
+            results.append(benchmark_backend(name, chunks, queries, args.concurrency))
+        except Exception as e:
+            print(colored(f"⚠️ Skipping {name}: {e}", "yellow"))
+    if not results:
+        raise SystemExit(1)
+
+    reference = results[0]
+    print(colored(f"\n{len(chunks)} chunks, {len(queries)} queries; quality relative to {reference['name']}", "cyan"))
+    print(f"{'backend':<11} {'load s':>7} {'docs/s':>8} {'q p50 ms':>9} {'q p95 ms':>9} {'qps':>7} "
+          f"{'batched qps':>12} {'cosine':>7} {f'recall@{args.k}':>9}")
+    for result in results:
+        cosine, recall = quality(result, reference, args.k)
+        print(f"{result['name']:<11} {result['load_s']:>7.2f} {result['docs_per_s']:>8.1f} "
+              f"{result['query_p50_ms']:>9.2f} {result['query_p95_ms']:>9.2f} {result['qps']:>7.1f} "
+              f"{result['batched_qps']:>12.1f} {cosine:>7.4f} {recall:>9.3f}")
@@ -0,0 +1,232 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are only serialised between threads of one process
+    fcntl = None
+
+
+class EmbeddingCache:
+    """Append-only on-disk store of chunk embeddings for one embedding model.
+
+    Layout under `<cache_dir>/<model>/`:
+      meta.json    - model name, vector dimension and dtype
+      vectors.bin  - raw row-major matrix, memory-mapped for reads
+      keys.txt     - one sha256(text) per line; line i is row i of vectors.bin
+      lock         - flock'ed around appends, so processes sharing the directory
+                     (the service and an indexing run) never write the same rows
+
+    Vectors are written before their keys. Every writer re-reads the keys appended by
+    other processes and cuts both files back to the last complete row under the lock,
+    so a crash mid-append only loses that append instead of misaligning later rows.
+    """
+
+    def __init__(self, cache_dir, model_name, dtype="float16"):
+        self.model_name = model_name
+        self.dtype = np.dtype(dtype)
+        self.path = os.path.join(cache_dir, re.sub(r"[^A-Za-z0-9_.-]+", "__", model_name))
+        self._vectors_path = os.path.join(self.path, "vectors.bin")
+        self._keys_path = os.path.join(self.path, "keys.txt")
+        self._meta_path = os.path.join(self.path, "meta.json")
+        self._lock_path = os.path.join(self.path, "lock")
+        self._lock = threading.Lock()
+        self._rows = {}
+        self._count = 0         # rows (key lines) read from disk so far
+        self._keys_offset = 0   # bytes of keys.txt read so far
+        self._matrix = None
+        self.dim = None
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    @staticmethod
+    def text_key(text):
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _stored_dim(self):
+        """Vector dimension of the cache on disk, or None if it is missing or for another model/dtype."""
+        if not os.path.exists(self._meta_path):
+            return None
+        with open(self._meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("model") != self.model_name or np.dtype(meta.get("dtype")) != self.dtype:
+            return None  # written by another model/dtype: start over on first write
+        return meta["dim"]
+
+    def _load(self):
+        self.dim = self._stored_dim()
+        if self.dim is None:
+            return
+        with self._file_lock():
+            self._sync()
+        self._remap()
+
+    @contextmanager
+    def _file_lock(self):
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(self.path, exist_ok=True)
+        with open(self._lock_path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _sync(self):
+        """Read keys appended since the last sync and drop any torn tail. Needs the file lock."""
+        row_bytes = self.dim * self.dtype.itemsize
+        for path in (self._vectors_path, self._keys_path):
+            if not os.path.exists(path):
+                open(path, "ab").close()
+        if os.path.getsize(self._keys_path) < self._keys_offset:
+            self._forget()  # another process started the cache over
+        stored_rows = os.path.getsize(self._vectors_path) // row_bytes
+        with open(self._keys_path, "rb") as f:
+            f.seek(self._keys_offset)
+            data = f.read()
+        for line in data.splitlines(keepends=True):
+            if not line.endswith(b"\n") or self._count >= stored_rows:
+                break  # key line cut short, or a key without its vector
+            self._rows.setdefault(line.decode("utf-8").strip(), self._count)
+            self._count += 1
+            self._keys_offset += len(line)
+        # Cut both files back to the last complete row so the next append starts aligned
+        if os.path.getsize(self._keys_path) != self._keys_offset:
+            with open(self._keys_path, "r+b") as f:
+                f.truncate(self._keys_offset)
+        if os.path.getsize(self._vectors_path) != self._count * row_bytes:
+            with open(self._vectors_path, "r+b") as f:
+                f.truncate(self._count * row_bytes)
+
+    def _remap(self):
+        rows = self._count
+        self._matrix = np.memmap(self._vectors_path, dtype=self.dtype, mode="r", shape=(rows, self.dim)) if rows else None
+
+    def _reset(self, dim):
+        os.makedirs(self.path, exist_ok=True)
+        for path in (self._vectors_path, self._keys_path):
+            open(path, "wb").close()
+        with open(self._meta_path, "w", encoding="utf-8") as f:
+            json.dump({"model": self.model_name, "dim": dim, "dtype": self.dtype.name}, f)
+        self.dim = dim
+        self._forget()
+
+    def _forget(self):
+        self._rows = {}
+        self._count = 0
+        self._keys_offset = 0
+        self._matrix = None
+
+    def __len__(self):
+        return len(self._rows)
+
+    def get_many(self, keys):
+        """Return a list aligned with `keys`: a float32 vector list for hits, None for misses."""
+        with self._lock:
+            results = []
+            for key in keys:
+                row = self._rows.get(key)
+                if row is None:
+                    self.misses += 1
+                    results.append(None)
+                else:
+                    self.hits += 1
+                    results.append(self._matrix[row].astype(np.float32).tolist())
+            return results
+
+    def put_many(self, keys, vectors):
+        if not keys:
+            return
+        matrix = np.asarray(vectors, dtype=np.float32)
+        with self._lock, self._file_lock():
+            stored_dim = self._stored_dim()
+            if stored_dim != self.dim:
+                # Another process created (or started over) the cache since we last looked
+                self.dim = stored_dim
+                self._forget()
+            if self.dim != matrix.shape[1]:
+                self._reset(matrix.shape[1])
+            self._sync()
+            fresh, seen = [], set(self._rows)
+            for i, key in enumerate(keys):
+                if key not in seen:
+                    seen.add(key)
+                    fresh.append(i)
+            if fresh:
+                with open(self._vectors_path, "ab") as f:
+                    f.write(matrix[fresh].astype(self.dtype).tobytes())
+                lines = "".join(keys[i] + "\n" for i in fresh).encode("utf-8")
+                with open(self._keys_path, "ab") as f:
+                    f.write(lines)
+                for i in fresh:
+                    self._rows[keys[i]] = self._count
+                    self._count += 1
+                self._keys_offset += len(lines)
+            self._remap()
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that only sends texts missing from the cache to the model."""
+
+    def __init__(self, embeddings, cache):
+        self.embeddings = embeddings
+        self.cache = cache
+
+    def embed_documents(self, texts):
+        keys = [EmbeddingCache.text_key(text) for text in texts]
+        vectors = self.cache.get_many(keys)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            computed = self.embeddings.embed_documents([texts[i] for i in missing])
+            self.cache.put_many([keys[i] for i in missing], computed)
+            for i, vector in zip(missing, computed):
+                vectors[i] = list(vector)
+        return vectors
+
+    def embed_query(self, text):
+        return self.embeddings.embed_query(text)
+
+
+class QueryCachedEmbeddings(Embeddings):
+    """Keeps the most recent query embeddings in memory (LRU).
+
+    The same question is searched against several companies and again after every
+    rewrite loop, so it should only go through the model once.
+    """
+
+    def __init__(self, embeddings, maxsize=1024):
+        self.embeddings = embeddings
+        self.maxsize = maxsize
+        self._queries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def embed_documents(self, texts):
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        with self._lock:
+            vector = self._queries.get(text)
+            if vector is not None:
+                self._queries.move_to_end(text)
+                self.hits += 1
+                return list(vector)
+            self.misses += 1
+        vector = self.embeddings.embed_query(text)
+        with self._lock:
+            self._queries[text] = tuple(vector)
+            self._queries.move_to_end(text)
+            while len(self._queries) > self.maxsize:
+                self._queries.popitem(last=False)
+        return list(vector)
@@ -1,5 +1,6 @@
 import sys
 import os
+import argparse
 import datetime
 import warnings
 import re
@@ -10,7 +11,10 @@ warnings.filterwarnings("ignore", message=".*API key must be provided when using
 import time
 from termcolor import colored
 from langgraph_agent import run_graph_agent, run_legacy_agent
-from config import get_llm
+from concurrent.futures import ThreadPoolExecutor
+from config import get_llm, get_llm_cache, get_rate_limiter, LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE
+from rate_limit import is_rate_limit_error
+from instrumentation import PerfRecorder, write_report, load_report, compare_reports, print_comparison
 from langchain_core.prompts import ChatPromptTemplate
 
 TEST_MODE = "LEGACY" # Options: "GRAPH" or "LEGACY"
@@ -31,7 +35,7 @@ class DualLogger:
         self.terminal.flush()
         self.log.flush()
 
-def grade_answer_with_llm(question, agent_answer, expected_facts, forbidden_facts):
+def grade_answer_with_llm(question, agent_answer, expected_facts, forbidden_facts, callbacks=None):
     llm = get_llm(temperature=0) 
     
     prompt = ChatPromptTemplate.from_template("""
@@ -57,7 +61,7 @@ def grade_answer_with_llm(question, agent_answer, expected_facts, forbidden_fact
         "agent_answer": agent_answer,
         "expected_facts": str(expected_facts),
         "forbidden_facts": str(forbidden_facts)
-    })
+    }, {"callbacks": callbacks, "metadata": {"stage": "judge"}})
     
     return result.content.strip().upper()
 
@@ -152,7 +156,69 @@ TEST_CASES = [
     }
 ]
 
-def run_evaluation():
+PERF = PerfRecorder()
+
+def evaluate_case(test, mode=None, recorder=None):
+    """Run one test case (agent + judge) and return its result instead of printing it."""
+    mode = mode or TEST_MODE
+    start_time = time.time()
+    result = {"name": test["name"], "passed": False, "answer": "", "verdict": "", "error": None}
+    with (recorder or PERF).trace(test["name"]) as trace:
+        try:
+            if mode == "GRAPH":
+                answer = run_graph_agent(test["question"], callbacks=[trace])
+            else:
+                answer = run_legacy_agent(test["question"], callbacks=[trace])
+            trace.finish()  # "total" covers the agent only; the judge is its own stage
+            clean_answer = answer.split("Observation:")[0].strip()
+            verdict = grade_answer_with_llm(
+                test["question"], 
+                clean_answer, 
+                test["must_contain"], 
+                test["forbidden"],
+                callbacks=[trace]
+            )
+            result.update(answer=clean_answer, verdict=verdict, passed="PASS" in verdict)
+        except Exception as e:
+            result["error"] = e
+    result["elapsed"] = time.time() - start_time
+    return result
+
+def print_case_result(result):
+    if result["error"] is not None:
+        print(colored(f"❌ CRASH: {result['error']}", "red"))
+        return
+    clean_answer = result["answer"]
+    display_answer = clean_answer[:300] + "..." if len(clean_answer) > 300 else clean_answer
+    print(f"A: {display_answer}")
+    if result["passed"]:
+        print(colored(f"✅ PASS ({result['elapsed']:.2f}s)", "green"))
+    else:
+        print(colored(f"❌ FAIL ({result['elapsed']:.2f}s)", "red"))
+        print(f"   Agent Answer: {display_answer}")
+        print(f"   Judge Verdict: {result['verdict']}")
+
+def run_cases_parallel(cases, max_workers, mode=None, max_attempts=3):
+    """Run cases concurrently under the shared LLM rate limiter; results keep `cases` order.
+
+    A case that still crashes with a quota error after the per-call retries is run
+    again after a further limiter cooldown, up to `max_attempts` times. Only the
+    last attempt of each case is recorded in PERF.
+    """
+    def _run(test):
+        for attempt in range(1, max_attempts + 1):
+            attempt_perf = PerfRecorder()
+            result = evaluate_case(test, mode, attempt_perf)
+            if result["error"] is None or not is_rate_limit_error(result["error"]) or attempt == max_attempts:
+                break
+            get_rate_limiter().penalize()
+        PERF.merge(attempt_perf)
+        return result
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(_run, cases))
+
+def run_evaluation(parallel=1, report_path=None, baseline_path=None):
     score = 0
     total = len(TEST_CASES)
 
@@ -166,44 +232,57 @@ def run_evaluation():
     print(colored("🚀 STARTING AI-POWERED EVALUATION...", "cyan", attrs=["bold"]))
     print(f"==================================================\n")
 
-
-    for test in TEST_CASES:
-        print(f"Running: {test['name']}...")
-        start_time = time.time()
-        
-        try:
-            if TEST_MODE == "GRAPH":
-                answer = run_graph_agent(test["question"])
-            else:
-                answer = run_legacy_agent(test["question"])
-            clean_answer = answer.split("Observation:")[0].strip()
-            display_answer = clean_answer[:300] + "..." if len(clean_answer) > 300 else clean_answer
-            result = grade_answer_with_llm(
-                test["question"], 
-                clean_answer, 
-                test["must_contain"], 
-                test["forbidden"]
-            )
-            
-            elapsed = time.time() - start_time
-            print(f"A: {display_answer}")
-            if "PASS" in result:
-                score += 1
-                print(colored(f"✅ PASS ({elapsed:.2f}s)", "green"))
-            else:
-                print(colored(f"❌ FAIL ({elapsed:.2f}s)", "red"))
-                print(f"   Agent Answer: {display_answer}")
-                print(f"   Judge Verdict: {result}")
-
-        except Exception as e:
-            print(colored(f"❌ CRASH: {e}", "red"))
-        print("-" * 50)
+    suite_start = time.time()
+    if parallel > 1:
+        print(f"⚡ Running {total} cases with {parallel} workers (report follows in test order)\n")
+        results = run_cases_parallel(TEST_CASES, parallel)
+        print(f"==================================================\n")
+        for result in results:
+            print(f"Running: {result['name']}...")
+            print_case_result(result)
+            score += result["passed"]
+            print("-" * 50)
+    else:
+        for test in TEST_CASES:
+            print(f"Running: {test['name']}...")
+            result = evaluate_case(test)
+            print_case_result(result)
+            score += result["passed"]
+            print("-" * 50)
 
     print(colored(f"\n📊 FINAL SCORE: {score}/{total}", "magenta", attrs=["bold"]))
+    print(f"⏱️ Suite time: {time.time() - suite_start:.2f}s")
+    llm_cache = get_llm_cache()
+    if llm_cache is not None:
+        print(f"🗄️ LLM cache: {llm_cache.stats()}")
+    print(f"🚦 Rate limiter: {get_rate_limiter().stats()}")
+
+    PERF.label = f"{TEST_MODE} {timestamp}"
+    report = PERF.report()
+    print("\n⏱️ Stage latency (p50 / p95 / p99 seconds):")
+    for stage, row in report["stages"].items():
+        print(f"   {stage:<32} n={row['count']:<3} {row['p50_s']:.3f} / {row['p95_s']:.3f} / {row['p99_s']:.3f}")
+    print(f"   totals: {report['totals']}")
+    if report_path:
+        print(f"📝 Benchmark report written to {write_report(report, report_path)}")
+    if baseline_path:
+        print(f"\n🔍 Comparison with {baseline_path}:")
+        print_comparison(compare_reports(load_report(baseline_path), report))
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the Assignment 3 evaluation suite.")
+    parser.add_argument("--mode", choices=["GRAPH", "LEGACY"], default=TEST_MODE)
+    parser.add_argument("--parallel", type=int, default=1, help="number of test cases run at once")
+    parser.add_argument("--rpm", type=int, default=LLM_REQUESTS_PER_MINUTE, help="LLM requests per minute (0 = unlimited)")
+    parser.add_argument("--tpm", type=int, default=LLM_TOKENS_PER_MINUTE, help="LLM tokens per minute (0 = unlimited)")
+    parser.add_argument("--report", help="write per-stage latency/token report to REPORT.json and REPORT.csv")
+    parser.add_argument("--compare", help="baseline report JSON to compare this run against")
+    args = parser.parse_args()
+    TEST_MODE = args.mode
+    get_rate_limiter().configure(args.rpm or None, args.tpm or None)
+
     log_filename = f"evaluation_log_{datetime.datetime.now().strftime('%Y%m%d_%H%M')}.txt"
     sys.stdout = DualLogger(log_filename)
-    run_evaluation()
+    run_evaluation(parallel=args.parallel, report_path=args.report, baseline_path=args.compare)
     sys.stdout = sys.stdout.terminal
     print(f"\n[System] Log saved to {log_filename}")
\ No newline at end of file
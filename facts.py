@@ -0,0 +1,314 @@
+import os
+import re
+import sqlite3
+import threading
+from functools import lru_cache
+
+from catalog import AliasMatcher
+from config import DB_FOLDER, FILES
+
+
+# Line items from the consolidated statements (operations, balance sheets, cash flows...)
+# are extracted at ingest time into a small SQLite table, so direct lookups such as
+# "Apple's total net sales in 2024" can be answered without retrieval or any LLM call.
+FACTS_DB = os.path.join(DB_FOLDER, "facts.sqlite3")
+
+STATEMENT_HEADING = re.compile(r"consolidated (statements? of [a-z ,]+|balance sheets?)", re.IGNORECASE)
+UNIT_PATTERN = re.compile(r"\(in (millions|thousands|billions)", re.IGNORECASE)
+YEAR_PATTERN = re.compile(r"\b(19\d{2}|20\d{2})\b")
+COLUMN_YEAR = re.compile(r"(?:[A-Za-z]+ \d{1,2}, )?((?:19|20)\d{2})")
+COLUMN_HEADER = re.compile(r"(?:[A-Za-z]+ \d{1,2},?|years? ended.*|as of.*)", re.IGNORECASE)
+NUMBER_PATTERN = re.compile(r"^\(?\$?\s*-?[\d,]*\d(?:\.\d+)?\s*\)?%?$")
+DASHES = {"—", "–", "-"}
+
+WORD_PATTERN = re.compile(r"[a-z0-9&]+")
+IGNORED_WORDS = {
+    "a", "an", "and", "the", "of", "for", "in", "on", "to", "s", "what", "was", "is", "were",
+    "how", "much", "did", "does", "total", "fiscal", "year", "fy", "specific", "figure", "value",
+}
+# Question phrases that should also match the way the statements label them
+QUERY_SYNONYMS = {
+    "r&d": "research and development",
+    "capex": "purchases property equipment payments acquisition plant",
+    "capital expenditures": "purchases property equipment payments acquisition plant",
+    "revenue": "revenues net sales",
+    "sales": "net sales revenues",
+    "cost of goods sold": "cost of sales revenues",
+    "sg&a": "selling general and administrative",
+}
+# Questions asking for more than one number are left to the full graph
+NON_LOOKUP_WORDS = {"compare", "comparison", "versus", "vs", "which", "why", "trend", "growth", "percentage",
+                    "margin", "ratio", "difference", "change", "explain", "who"}
+# Words a lookup may contain besides the company, the year and the line item; any other word
+# of the question must be explained by the row's label, section or statement
+LOOKUP_FILLER_WORDS = {"according", "specifically", "report", "reported", "amount", "number", "company", "its",
+                       "their", "as", "at", "by", "from", "with", "during", "ended", "end", "annual", "10", "k",
+                       "be", "are", "has", "had", "have", "about", "tell", "me", "please", "give"}
+
+
+def _words(text):
+    return [w for w in WORD_PATTERN.findall(text.lower()) if w not in IGNORED_WORDS]
+
+
+def _parse_number(line):
+    text = line.strip().replace("$", "").replace(" ", "")
+    if text in DASHES:
+        return 0.0
+    if not NUMBER_PATTERN.match(line.strip()):
+        return None
+    negative = text.startswith("(") and text.endswith(")")
+    text = text.strip("()").replace(",", "").rstrip("%")
+    try:
+        value = float(text)
+    except ValueError:
+        return None
+    return -value if negative else value
+
+
+def extract_statement_facts(text, page):
+    """Parse one statement page (label line followed by one value per year column) into facts."""
+    lines = [line.strip() for line in text.splitlines()]
+    head = "\n".join(lines[:6])
+    heading = STATEMENT_HEADING.search(head)
+    unit = UNIT_PATTERN.search(head)
+    if not heading or not unit:
+        return []
+    statement = heading.group(0)
+    unit = unit.group(1).lower()
+
+    # Column headers: one year per line, optionally preceded by "Year Ended"/"December 31," lines
+    years, body_start = [], 0
+    for i, line in enumerate(lines[:24]):
+        match = COLUMN_YEAR.fullmatch(line)
+        if match:
+            years.append(int(match.group(1)))
+            body_start = i + 1
+        elif years and not COLUMN_HEADER.fullmatch(line):
+            break
+    if not years:
+        return []
+
+    facts, section, label, values = [], "", None, []
+    for line in lines[body_start:]:
+        if not line or line == "$":
+            continue
+        value = _parse_number(line)
+        if value is None:
+            if label is not None and not values and line[0].islower():
+                label = f"{label} {line}"  # wrapped label
+                continue
+            if label is not None and not values:
+                section = label  # a label without numbers heads the lines below it
+            label, values = line.rstrip(":"), []
+            continue
+        if label is None:
+            continue
+        values.append(value)
+        if len(values) == len(years):
+            row_unit = "per share" if "per share" in section.lower() and any(v != int(v) for v in values) else unit
+            for year, amount in zip(years, values):
+                facts.append({
+                    "statement": statement, "section": section, "line_item": label,
+                    "fiscal_year": year, "value": amount, "unit": row_unit, "page": page,
+                })
+            if section and label.lower() == f"total {section.lower()}":
+                section = ""  # "Total cost of revenues" closes "Cost of revenues"
+            label, values = None, []
+    return facts
+
+
+FACT_COLUMNS = ["fiscal_year", "statement", "section", "line_item", "unit", "value", "page", "source"]
+FILING_COLUMNS = ["form", "filing_year"]   # of the filing each fact was read from, for citations
+
+
+class FactStore:
+    """Typed fact table keyed by (company, fiscal_year, statement, section, line_item, unit, source).
+
+    Each filing keeps its own rows, so a prior-year column restated in a newer 10-K does
+    not collide with the older filing's figure; reads prefer the newest filing.
+    """
+
+    def __init__(self, path=FACTS_DB):
+        self.path = path
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path)
+            key_columns = [row[1] for row in conn.execute("PRAGMA table_info(facts)") if row[5]]
+            filing_columns = [row[1] for row in conn.execute("PRAGMA table_info(filings)")]
+            if (key_columns and "source" not in key_columns) or (filing_columns and "form" not in filing_columns):
+                # Tables from before facts were keyed per filing (or filings had a form); re-extracted on next update
+                with conn:
+                    conn.execute("DROP TABLE facts")
+                    conn.execute("DROP TABLE IF EXISTS filings")
+            conn.execute("""CREATE TABLE IF NOT EXISTS facts (
+                company TEXT, fiscal_year INTEGER, statement TEXT, section TEXT, line_item TEXT,
+                unit TEXT, value REAL, page INTEGER, source TEXT,
+                PRIMARY KEY (company, fiscal_year, statement, section, line_item, unit, source))""")
+            # One row per extracted filing; a company can have several (one per fiscal year)
+            conn.execute("""CREATE TABLE IF NOT EXISTS filings (
+                company TEXT, source TEXT, file_hash TEXT, filing_year INTEGER, form TEXT,
+                PRIMARY KEY (company, source))""")
+            self._local.conn = conn
+        return conn
+
+    def is_current(self, company, source, file_hash):
+        row = self._conn().execute("SELECT file_hash FROM filings WHERE company = ? AND source = ?",
+                                   (company, source)).fetchone()
+        return row is not None and row[0] == file_hash
+
+    def replace(self, company, file_hash, source, pages, filing_year=None, form="10-K"):
+        """Re-extract the facts of one filing (`source`) from an iterable of (page_number, text)."""
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM facts WHERE company = ? AND source = ?", (company, source))
+            count = 0
+            for page, text in pages:
+                for fact in extract_statement_facts(text, page):
+                    conn.execute(
+                        "INSERT OR IGNORE INTO facts VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (company, fact["fiscal_year"], fact["statement"], fact["section"], fact["line_item"],
+                         fact["unit"], fact["value"], fact["page"], source),
+                    )
+                    count += 1
+            conn.execute("INSERT OR REPLACE INTO filings VALUES (?, ?, ?, ?, ?)",
+                         (company, source, file_hash, filing_year, form))
+        return count
+
+    def facts_for(self, company, fiscal_year=None):
+        """Facts of `company`; a line item reported by several filings comes from the newest one."""
+        columns = [f"f.{c}" for c in FACT_COLUMNS] + [f"fl.{c}" for c in FILING_COLUMNS]
+        query = ("SELECT " + ", ".join(columns) + " FROM facts f "
+                 "LEFT JOIN filings fl ON fl.company = f.company AND fl.source = f.source WHERE f.company = ?")
+        params = [company]
+        if fiscal_year is not None:
+            query += " AND f.fiscal_year = ?"
+            params.append(fiscal_year)
+        query += " ORDER BY COALESCE(fl.filing_year, 0) DESC, fl.rowid DESC"
+        facts = {}
+        for row in self._conn().execute(query, params):
+            fact = dict(zip(FACT_COLUMNS + FILING_COLUMNS, row))
+            key = (fact["fiscal_year"], fact["statement"], fact["section"], fact["line_item"], fact["unit"])
+            facts.setdefault(key, fact)
+        return list(facts.values())
+
+    def latest_year(self, company):
+        row = self._conn().execute("SELECT MAX(fiscal_year) FROM facts WHERE company = ?", (company,)).fetchone()
+        return row[0] if row else None
+
+
+FACT_STORE = FactStore()
+
+
+def update_facts(company, file_path, file_hash, pages, filing_year=None, form="10-K"):
+    """Refresh the facts of one filing unless they were already extracted from this file version.
+
+    `filing_year` orders filings when several report the same line item (newest wins);
+    it and `form` are cited in answers.
+    """
+    source = os.path.basename(file_path)
+    if FACT_STORE.is_current(company, source, file_hash):
+        return
+    count = FACT_STORE.replace(company, file_hash, source, pages, filing_year, form)
+    print(f"   {company}: {count} statement facts extracted")
+
+
+def _expand(question):
+    text = question.lower()
+    for phrase, expansion in QUERY_SYNONYMS.items():
+        if phrase in text:
+            text += " " + expansion
+    return set(_words(text))
+
+
+def _label_words(line_item):
+    # Qualifiers such as "excluding finance leases, net of sales" are not needed to match
+    return _words(re.split(r"\bexcluding\b|, net of\b", line_item, flags=re.IGNORECASE)[0])
+
+
+def _stem(word):
+    return word[:-1] if len(word) > 3 and word.endswith("s") else word
+
+
+def _uncovered_words(question, fact, identity_words):
+    """Content words of the question that `fact` does not account for (empty = a complete match)."""
+    covered = set(_words(f"{fact['statement']} {fact['section']} {fact['line_item']}"))
+    text = question.lower()
+    for phrase, expansion in QUERY_SYNONYMS.items():
+        if phrase in text and covered & set(expansion.split()):
+            text = text.replace(phrase, " ")
+    covered = {_stem(w) for w in covered}
+    return [w for w in _words(text)
+            if not YEAR_PATTERN.fullmatch(w) and w not in identity_words and w not in LOOKUP_FILLER_WORDS
+            and _stem(w) not in covered]
+
+
+def _format_amount(value, unit):
+    if unit == "per share":
+        return f"${value:,.2f} per share"
+    amount = f"${abs(value):,.0f} {unit.rstrip('s')}"
+    if unit == "millions" and abs(value) >= 1000:
+        amount += f" (approximately ${abs(value) / 1000:,.2f} billion)"
+    if value < 0:
+        amount += ", reported as a negative amount (outflow/expense)"
+    return amount
+
+
+@lru_cache(maxsize=8)
+def _matcher(companies, aliases):
+    return AliasMatcher(companies, {company: list(names) for company, names in aliases})
+
+
+def lookup_fact(question, companies=None, aliases=None):
+    """Return (answer, fact) for a single-line-item question, or None if it is not a direct lookup.
+
+    `aliases` (company -> names, as in Catalog.aliases()) are recognised as well as the keys.
+    """
+    companies = tuple(companies or FILES)
+    matches = _matcher(companies, tuple(sorted((c, tuple(a)) for c, a in (aliases or {}).items()))).matches(question)
+    mentioned = {company for company, _ in matches}
+    if len(mentioned) != 1:
+        return None
+    words = set(WORD_PATTERN.findall(question.lower()))
+    if words & NON_LOOKUP_WORDS:
+        return None
+    company = mentioned.pop()
+    # The company's own names and tickers ("Tesla Inc", "TSLA") are not content words; product
+    # aliases such as "iPhone" are, so they must still be explained by the matched row
+    identity_words = {company}
+    for _, alias in matches:
+        if alias.isupper() or company in _words(alias):
+            identity_words.update(_words(alias))
+    years = [int(y) for y in YEAR_PATTERN.findall(question)]
+    if len(set(years)) > 1:
+        return None
+    year = years[0] if years else FACT_STORE.latest_year(company)
+    if year is None:
+        return None
+
+    query_words = _expand(question)
+    best, best_key = [], None
+    for fact in FACT_STORE.facts_for(company, year):
+        label = _label_words(fact["line_item"])
+        if not label or not set(label) <= query_words or _uncovered_words(question, fact, identity_words):
+            continue
+        section = set(_words(fact["section"]))
+        # Prefer the row whose label + section explain most of the question, then the tightest section
+        key = (len((set(label) | section) & query_words), -len(section - query_words))
+        if best_key is None or key > best_key:
+            best, best_key = [fact], key
+        elif key == best_key:
+            best.append(fact)
+    if not best or len({(f["value"], f["unit"]) for f in best}) != 1:
+        return None  # nothing matched, or equally good matches disagree
+
+    fact = best[0]
+    label = f"{fact['section']} - {fact['line_item']}" if fact["section"] else fact["line_item"]
+    filing = " ".join(str(part) for part in (company.capitalize(), fact["form"], fact["filing_year"]) if part)
+    answer = (f"{company.capitalize()}'s {label} for fiscal year {fact['fiscal_year']} was "
+              f"{_format_amount(fact['value'], fact['unit'])}. "
+              f"[Source: {filing}, {fact['statement']}, page {fact['page'] + 1}]")
+    return answer, fact
@@ -0,0 +1,71 @@
+import re
+import numpy as np
+
+from lexical import tokenize
+
+
+# Source tags added by context.pack_context; they name the company, not the content
+SOURCE_TAG = re.compile(r"^\[Source:[^\]]*\]\s*$", re.MULTILINE)
+
+
+class LocalGrader:
+    """Relevance grader that runs on CPU with the retrieval embedding model.
+
+    The score mixes the best cosine similarity between the question and any
+    ~`window_chars` window of the context with the share of question terms that
+    occur in the context. Scores at or above `yes_threshold` are relevant, below
+    `no_threshold` irrelevant; anything in between is left to the LLM grader
+    unless `grade(..., decide=True)` forces a call at the midpoint.
+
+    Context windows are new text on every call, so they are embedded with
+    `window_embeddings_factory` (default: the query one), which should not persist
+    what it embeds; the question goes through `embeddings_factory` and its query LRU.
+    """
+
+    def __init__(self, embeddings_factory, yes_threshold=0.45, no_threshold=0.25, window_chars=1000,
+                 similarity_weight=0.6, window_embeddings_factory=None):
+        self.embeddings_factory = embeddings_factory
+        self.window_embeddings_factory = window_embeddings_factory or embeddings_factory
+        self.yes_threshold = yes_threshold
+        self.no_threshold = no_threshold
+        self.window_chars = window_chars
+        self.similarity_weight = similarity_weight
+
+    def _windows(self, text):
+        windows, current = [], ""
+        for paragraph in text.split("\n"):
+            if current and len(current) + len(paragraph) > self.window_chars:
+                windows.append(current)
+                current = ""
+            current = f"{current}\n{paragraph}" if current else paragraph
+        if current.strip():
+            windows.append(current)
+        return [w for w in windows if w.strip()]
+
+    def score(self, question, documents):
+        text = SOURCE_TAG.sub("", documents or "")
+        windows = self._windows(text)
+        if not windows:
+            return {"similarity": 0.0, "coverage": 0.0, "score": 0.0}
+
+        query = np.asarray(self.embeddings_factory().embed_query(question), dtype=np.float32)
+        matrix = np.asarray(self.window_embeddings_factory().embed_documents(windows), dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(query) or 1.0)
+        similarity = float(np.max(matrix @ query / np.where(norms == 0, 1.0, norms)))
+
+        terms = set(tokenize(question))
+        coverage = len(terms & set(tokenize(text))) / len(terms) if terms else 0.0
+        score = self.similarity_weight * max(similarity, 0.0) + (1 - self.similarity_weight) * coverage
+        return {"similarity": similarity, "coverage": coverage, "score": score}
+
+    def grade(self, question, documents, decide=False):
+        """Return ("yes" | "no" | None, scores); None means not confident enough."""
+        scores = self.score(question, documents)
+        if scores["score"] >= self.yes_threshold:
+            return "yes", scores
+        if scores["score"] < self.no_threshold:
+            return "no", scores
+        if decide:
+            midpoint = (self.yes_threshold + self.no_threshold) / 2
+            return ("yes" if scores["score"] >= midpoint else "no"), scores
+        return None, scores
@@ -0,0 +1,342 @@
+import atexit
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from termcolor import colored
+
+from config import (
+    CHUNK_SIZE, CHUNK_OVERLAP, SEPARATORS, EMBEDDING_MODEL_ID,
+    INGEST_WORKERS, PAGES_PER_TASK, EMBED_BATCH_SIZE, PAGE_CACHE_PATH, PAGE_CACHE_TABLES,
+)
+from page_cache import PageCache
+
+
+# Every persisted collection keeps a manifest next to its Chroma files. It records
+# what the index was built from, so a changed PDF, splitter or embedding model is
+# detected on startup and only the affected chunks are re-embedded.
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 2   # 2: chunk ids are also stored in chunk metadata
+
+
+def file_sha256(file_path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def splitter_settings():
+    return {
+        "chunk_size": CHUNK_SIZE,
+        "chunk_overlap": CHUNK_OVERLAP,
+        "separators": list(SEPARATORS),
+    }
+
+
+def get_splitter():
+    return RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP,
+        separators=SEPARATORS,
+        add_start_index=True,  # keeps chunk ids stable and lets neighbours be merged later
+    )
+
+
+def chunk_id(doc):
+    """Deterministic id for a chunk: same page, offset and text -> same id."""
+    key = f"{doc.metadata.get('page', '')}:{doc.metadata.get('start_index', '')}:{doc.page_content}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+
+def stored_id(doc):
+    """The id a search result was stored under.
+
+    Older langchain-chroma releases return documents without `id`; the id is then read
+    from the chunk metadata (it carries the filing prefix in shared collections), and
+    only recomputed for chunks indexed before it was stored there.
+    """
+    return doc.id or doc.metadata.get("chunk_id") or chunk_id(doc)
+
+
+def load_manifest(persist_dir):
+    path = os.path.join(persist_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_manifest(persist_dir, manifest):
+    os.makedirs(persist_dir, exist_ok=True)
+    path = os.path.join(persist_dir, MANIFEST_NAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+
+
+def is_reusable(manifest):
+    """Chunk ids in the manifest can be reused only if they were embedded with the current model."""
+    return (
+        manifest is not None
+        and manifest.get("version") == MANIFEST_VERSION
+        and manifest.get("embedding_model") == EMBEDDING_MODEL_ID
+    )
+
+
+def is_current(manifest, file_hash):
+    return (
+        is_reusable(manifest)
+        and manifest.get("file_hash") == file_hash
+        and manifest.get("splitter") == splitter_settings()
+    )
+
+
+def index_fingerprint(manifest):
+    """Short digest of the chunk set a manifest describes; derived indexes store it to detect staleness."""
+    if manifest is None:
+        return None
+    return hashlib.sha256("\n".join(sorted(manifest.get("chunk_ids", []))).encode("utf-8")).hexdigest()[:32]
+
+
+def page_layout(page, tables=True):
+    """Text blocks and (optionally) detected tables of one fitz page, as JSON-friendly lists."""
+    blocks = [[round(x0, 1), round(y0, 1), round(x1, 1), round(y1, 1), text]
+              for x0, y0, x1, y1, text, _, block_type in page.get_text("blocks") if block_type == 0]
+    found = []
+    if tables:
+        for table in page.find_tables().tables:
+            found.append({"bbox": [round(v, 1) for v in table.bbox], "rows": table.extract()})
+    return blocks, found
+
+
+def parse_pages(file_path, start, stop, layout=False):
+    """Extract text (and layout if asked) for pages [start, stop).
+
+    Runs in worker processes, so it returns plain tuples:
+    (page, text, total_pages) or (page, text, total_pages, blocks, tables).
+    """
+    import fitz
+
+    records = []
+    with fitz.open(file_path) as pdf:
+        total_pages = pdf.page_count
+        for number in range(start, min(stop, total_pages)):
+            page = pdf[number]
+            record = (number, page.get_text(), total_pages)
+            records.append(record + page_layout(page, PAGE_CACHE_TABLES) if layout else record)
+    return records
+
+
+def page_count(file_path):
+    import fitz
+
+    with fitz.open(file_path) as pdf:
+        return pdf.page_count
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_ingest_pool():
+    """Process pool shared by every collection being built (None when INGEST_WORKERS <= 1)."""
+    global _pool
+    if INGEST_WORKERS <= 1:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            # Not fork: the pool starts lazily from warm-up/search threads after torch, ONNX and Chroma
+            # have started threads of their own, and a forked child can inherit their held locks
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _pool = ProcessPoolExecutor(max_workers=INGEST_WORKERS, mp_context=multiprocessing.get_context(method))
+            atexit.register(_pool.shutdown)
+    return _pool
+
+
+_page_cache = None
+_page_cache_lock = threading.Lock()
+
+
+def get_page_cache():
+    """Page cache shared by every collection being built (None when PAGE_CACHE_PATH is "")."""
+    global _page_cache
+    if _page_cache is None and PAGE_CACHE_PATH:
+        with _page_cache_lock:
+            if _page_cache is None:
+                _page_cache = PageCache(PAGE_CACHE_PATH)
+    return _page_cache
+
+
+def _parse_batches(file_path, layout):
+    """Parse the PDF in PAGES_PER_TASK batches, at most 2 * INGEST_WORKERS tasks in flight."""
+    total = page_count(file_path)
+    ranges = ((start, start + PAGES_PER_TASK) for start in range(0, total, PAGES_PER_TASK))
+    pool = get_ingest_pool()
+    if pool is None:
+        for start, stop in ranges:
+            yield parse_pages(file_path, start, stop, layout)
+        return
+    in_flight = deque()
+    for start, stop in ranges:
+        in_flight.append(pool.submit(parse_pages, file_path, start, stop, layout))
+        if len(in_flight) >= 2 * INGEST_WORKERS:
+            yield in_flight.popleft().result()
+    while in_flight:
+        yield in_flight.popleft().result()
+
+
+def _page_records(file_path, file_hash=None):
+    """(page, text, total_pages) in order: from the page cache if this file version was
+    parsed before, otherwise parsed now and written to the cache batch by batch."""
+    cache = get_page_cache()
+    if cache is None:
+        for batch in _parse_batches(file_path, layout=False):
+            yield from batch
+        return
+    file_hash = file_hash or file_sha256(file_path)
+    if cache.is_complete(file_hash):
+        yield from cache.iter_pages(file_hash)
+        return
+    parsed = 0
+    for batch in _parse_batches(file_path, layout=True):
+        cache.put_pages(file_hash, batch)
+        parsed += len(batch)
+        for number, text, total_pages, _, _ in batch:
+            yield number, text, total_pages
+    cache.mark_complete(file_hash, parsed)
+
+
+def iter_pages(file_path, file_hash=None):
+    """Yield one Document per page, in order, without ever holding the whole filing.
+
+    Pages come from the parsed-page cache when this version of the file (`file_hash`,
+    computed if not given) was parsed before; otherwise the PDF is parsed ahead in
+    the process pool and each batch is cached as it arrives.
+    """
+    for number, text, total_pages in _page_records(file_path, file_hash):
+        # TODO (Optional): Clean the data to remove noise (e.g., "\n")
+        # You can replace newlines with spaces or remove headers/footers here.
+        # Example (Dirty data cleanup):
+        # text = text.replace("\n", " ")
+        yield Document(
+            page_content=text,
+            metadata={"source": file_path, "file_path": file_path, "page": number, "total_pages": total_pages},
+        )
+
+
+def iter_splits(file_path, file_hash=None):
+    """Split pages as they arrive instead of loading the whole PDF first."""
+    splitter = get_splitter()
+    for page in iter_pages(file_path, file_hash):
+        yield from splitter.split_documents([page])
+
+
+def _batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def delete_where(vectorstore, where):
+    """Delete every chunk matching a metadata filter, in batches."""
+    ids = vectorstore.get(where=where, include=[])["ids"]
+    for batch in _batched(ids, EMBED_BATCH_SIZE):
+        vectorstore.delete(ids=batch)
+    return len(ids)
+
+
+def build_or_update_index(key, file_path, persist_dir, embeddings, vectorstore=None, manifest_dir=None,
+                          metadata=None):
+    """Open the collection for `key`, rebuilding only what changed since the manifest was written.
+
+    `metadata` (company/form/year/filing) is stamped on every chunk. For a collection
+    shared by many filings, pass it open as `vectorstore` together with this filing's
+    own `manifest_dir`: chunk ids are then prefixed with the filing id and a rebuild
+    only deletes this filing's chunks.
+    """
+    manifest_dir = manifest_dir or persist_dir
+    shared = vectorstore is not None
+    file_hash = file_sha256(file_path)
+    manifest = load_manifest(manifest_dir)
+
+    if is_current(manifest, file_hash):
+        print(f"✅ Found existing DB for {key}")
+        return vectorstore if shared else Chroma(persist_directory=persist_dir, embedding_function=embeddings)
+
+    had_collection = os.path.exists(os.path.join(persist_dir, "chroma.sqlite3"))
+    if not shared:
+        vectorstore = Chroma(persist_directory=persist_dir, embedding_function=embeddings)
+    if is_reusable(manifest):
+        print(f"🔁 Index for {key} is stale, updating changed chunks...")
+        known_ids = set(manifest.get("chunk_ids", []))
+    elif shared:
+        print(f"🔨 Building index for {key} (This happens once)...")
+        delete_where(vectorstore, {"filing": metadata["filing"]})  # leftovers of an unusable build
+        known_ids = set()
+    else:
+        if had_collection:
+            # Built without a manifest or with another embedding model: ids/vectors are unusable
+            print(colored(f"⚠️ Index for {key} has no usable manifest, rebuilding from scratch", "yellow"))
+            vectorstore.delete_collection()
+            vectorstore = Chroma(persist_directory=persist_dir, embedding_function=embeddings)
+        else:
+            print(f"🔨 Building index for {key} (This happens once)...")
+        known_ids = set()
+
+    # Only ids are kept for the whole file; chunk text is held one batch at a time.
+    chunk_ids = []
+    seen = set()
+
+    def _new_chunks():
+        for doc in iter_splits(file_path, file_hash):
+            doc.metadata.update(metadata or {})
+            doc_id = f"{metadata['filing']}:{chunk_id(doc)}" if shared else chunk_id(doc)
+            if doc_id in seen:
+                continue
+            doc.metadata["chunk_id"] = doc_id
+            seen.add(doc_id)
+            chunk_ids.append(doc_id)
+            if doc_id not in known_ids:
+                yield doc_id, doc
+
+    embedded = 0
+    for batch in _batched(_new_chunks(), EMBED_BATCH_SIZE):
+        vectorstore.add_texts(
+            [doc.page_content for _, doc in batch],
+            metadatas=[doc.metadata for _, doc in batch],
+            ids=[doc_id for doc_id, _ in batch],
+        )
+        embedded += len(batch)
+
+    stale_ids = [i for i in known_ids if i not in seen]
+    for batch in _batched(stale_ids, EMBED_BATCH_SIZE):
+        vectorstore.delete(ids=batch)
+    print(f"   {key}: {embedded} chunks embedded, {len(stale_ids)} removed, "
+          f"{len(chunk_ids) - embedded} reused")
+
+    save_manifest(manifest_dir, {
+        "version": MANIFEST_VERSION,
+        "source": os.path.basename(file_path),
+        "file_hash": file_hash,
+        "splitter": splitter_settings(),
+        "embedding_model": EMBEDDING_MODEL_ID,
+        "chunk_ids": chunk_ids,
+    })
+    return vectorstore
@@ -0,0 +1,285 @@
+import argparse
+import contextvars
+import csv
+import json
+import threading
+import time
+from contextlib import contextmanager
+from langchain_core.callbacks import BaseCallbackHandler
+
+
+# Stage names used in reports:
+#   node:<graph node>        one LangGraph node execution (retrieve, grade_documents, ...)
+#   retriever:<run name>     one retriever call (per company)
+#   llm:<node or stage>      one chat model call, attributed to the node/stage that made it
+#   ttft:<node or stage>     time to the first streamed token of a chat model call
+#   total                    one whole question, agent only (the judge is reported separately)
+_CURRENT_TRACE = contextvars.ContextVar("current_trace", default=None)
+
+
+class TraceHandler(BaseCallbackHandler):
+    """Callback handler collecting the spans of one question."""
+
+    def __init__(self, name):
+        self.name = name
+        self.spans = []          # (stage, seconds)
+        self.llm_calls = []      # {"stage", "seconds", "prompt_tokens", "completion_tokens"}
+        self.retries = 0
+        self.retrievals = 0
+        self.started = time.perf_counter()
+        self.elapsed = None
+        self._open = {}
+        self._first_token = set()
+        self._lock = threading.Lock()
+
+    def _start(self, run_id, stage):
+        with self._lock:
+            self._open[run_id] = (stage, time.perf_counter())
+
+    def _end(self, run_id):
+        with self._lock:
+            opened = self._open.pop(run_id, None)
+            if opened is None:
+                return None, 0.0
+            stage, started = opened
+            seconds = time.perf_counter() - started
+            self.spans.append((stage, seconds))
+            return stage, seconds
+
+    @staticmethod
+    def _stage(metadata):
+        metadata = metadata or {}
+        return metadata.get("stage") or metadata.get("langgraph_node") or "agent"
+
+    def on_chain_start(self, serialized, inputs, *, run_id, metadata=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node")
+        if node and not node.startswith("__") and kwargs.get("name") == node:
+            self._start(run_id, f"node:{node}")
+            if node == "retrieve":
+                with self._lock:
+                    self.retrievals += 1
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_retriever_start(self, serialized, query, *, run_id, **kwargs):
+        self._start(run_id, f"retriever:{kwargs.get('name') or 'retriever'}")
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_retriever_error(self, error, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        self._start(run_id, f"llm:{self._stage(metadata)}")
+
+    def on_llm_start(self, serialized, prompts, *, run_id, metadata=None, **kwargs):
+        self._start(run_id, f"llm:{self._stage(metadata)}")
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        with self._lock:
+            opened = self._open.get(run_id)
+            if opened is not None and run_id not in self._first_token:
+                self._first_token.add(run_id)
+                stage = opened[0].replace("llm:", "ttft:", 1)
+                self.spans.append((stage, time.perf_counter() - opened[1]))
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        stage, seconds = self._end(run_id)
+        if stage is None:
+            return
+        prompt_tokens = completion_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                prompt_tokens += usage.get("input_tokens", 0)
+                completion_tokens += usage.get("output_tokens", 0)
+        with self._lock:
+            self.llm_calls.append({"stage": stage, "seconds": seconds,
+                                   "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens})
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def note_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def finish(self):
+        if self.elapsed is None:
+            self.elapsed = time.perf_counter() - self.started
+            self.spans.append(("total", self.elapsed))
+
+    def summary(self):
+        return {
+            "name": self.name,
+            "seconds": self.elapsed,
+            "retries": self.retries,
+            "rewrite_depth": max(0, self.retrievals - 1),
+            "prompt_tokens": sum(c["prompt_tokens"] for c in self.llm_calls),
+            "completion_tokens": sum(c["completion_tokens"] for c in self.llm_calls),
+            "llm_calls": len(self.llm_calls),
+        }
+
+
+def note_retry(retry_state=None):
+    """tenacity `before_sleep` hook: count a retry against the question being traced."""
+    trace = _CURRENT_TRACE.get()
+    if trace is not None:
+        trace.note_retry()
+
+
+def percentile(values, q):
+    """Linear-interpolated percentile (q in 0..100) of a list of numbers."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100.0
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def load_workload(path):
+    """(name, question) pairs from a JSONL file: `question`, else `body`/`title` per line."""
+    questions = []
+    with open(path, "r", encoding="utf-8") as f:
+        for number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            text = record.get("question") or record.get("body") or record.get("title")
+            questions.append((record.get("name") or record.get("request_id") or f"q{number}", text))
+    return questions
+
+
+class PerfRecorder:
+    """Collects one TraceHandler per question and turns them into a stage-level report."""
+
+    def __init__(self, label=""):
+        self.label = label
+        self.traces = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def trace(self, name):
+        """Use the yielded handler as a LangChain callback for everything done for `name`."""
+        handler = TraceHandler(name)
+        token = _CURRENT_TRACE.set(handler)
+        try:
+            yield handler
+        finally:
+            handler.finish()
+            _CURRENT_TRACE.reset(token)
+            with self._lock:
+                self.traces.append(handler)
+
+    def merge(self, other):
+        """Add the traces collected by another recorder (e.g. the attempt that counted)."""
+        with self._lock:
+            self.traces.extend(other.traces)
+
+    def report(self):
+        durations, tokens = {}, {}
+        for trace in self.traces:
+            for stage, seconds in trace.spans:
+                durations.setdefault(stage, []).append(seconds)
+            for call in trace.llm_calls:
+                stage_tokens = tokens.setdefault(call["stage"], {"prompt_tokens": 0, "completion_tokens": 0})
+                stage_tokens["prompt_tokens"] += call["prompt_tokens"]
+                stage_tokens["completion_tokens"] += call["completion_tokens"]
+
+        stages = {}
+        for stage, values in sorted(durations.items()):
+            stages[stage] = {
+                "count": len(values),
+                "total_s": sum(values),
+                "mean_s": sum(values) / len(values),
+                "p50_s": percentile(values, 50),
+                "p95_s": percentile(values, 95),
+                "p99_s": percentile(values, 99),
+                **tokens.get(stage, {"prompt_tokens": 0, "completion_tokens": 0}),
+            }
+        runs = [trace.summary() for trace in self.traces]
+        return {
+            "label": self.label,
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "stages": stages,
+            "runs": runs,
+            "totals": {
+                "questions": len(runs),
+                "retries": sum(r["retries"] for r in runs),
+                "rewrites": sum(r["rewrite_depth"] for r in runs),
+                "max_rewrite_depth": max((r["rewrite_depth"] for r in runs), default=0),
+                "prompt_tokens": sum(r["prompt_tokens"] for r in runs),
+                "completion_tokens": sum(r["completion_tokens"] for r in runs),
+            },
+        }
+
+
+STAGE_COLUMNS = ["count", "total_s", "mean_s", "p50_s", "p95_s", "p99_s", "prompt_tokens", "completion_tokens"]
+
+
+def write_report(report, path):
+    """Write `<path>.json` (full report) and `<path>.csv` (one row per stage)."""
+    base = path[:-5] if path.endswith(".json") else path
+    with open(base + ".json", "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    with open(base + ".csv", "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["stage"] + STAGE_COLUMNS)
+        for stage, row in report["stages"].items():
+            writer.writerow([stage] + [row[c] for c in STAGE_COLUMNS])
+    return base + ".json"
+
+
+def load_report(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare_reports(baseline, current, threshold=0.10):
+    """Per-stage p50/p95/p99 deltas; a stage regresses if any percentile grows by more than `threshold`."""
+    rows = []
+    for stage in sorted(set(baseline["stages"]) | set(current["stages"])):
+        before, after = baseline["stages"].get(stage), current["stages"].get(stage)
+        row = {"stage": stage, "regression": False}
+        for metric in ("p50_s", "p95_s", "p99_s"):
+            old = before[metric] if before else None
+            new = after[metric] if after else None
+            change = (new - old) / old if old and new is not None else None
+            row[metric] = (old, new, change)
+            if change is not None and change > threshold:
+                row["regression"] = True
+        rows.append(row)
+    return rows
+
+
+def print_comparison(rows):
+    def fmt(value):
+        return "-" if value is None else f"{value:.3f}"
+
+    print(f"{'stage':<32} {'p50 before/after':>22} {'p95 before/after':>22} {'p99 before/after':>22}")
+    for row in rows:
+        cells = []
+        for metric in ("p50_s", "p95_s", "p99_s"):
+            old, new, change = row[metric]
+            delta = "" if change is None else f" ({change:+.0%})"
+            cells.append(f"{fmt(old)}/{fmt(new)}{delta}")
+        flag = "  ⚠️ REGRESSION" if row["regression"] else ""
+        print(f"{row['stage']:<32} {cells[0]:>22} {cells[1]:>22} {cells[2]:>22}{flag}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare two benchmark reports written by evaluator.py --report.")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative slowdown flagged as a regression")
+    args = parser.parse_args()
+    rows = compare_reports(load_report(args.baseline), load_report(args.current), args.threshold)
+    print_comparison(rows)
+    raise SystemExit(1 if any(row["regression"] for row in rows) else 0)
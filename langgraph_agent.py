@@ -1,70 +1,59 @@
 import os
+import threading
+import time
 from typing import Annotated, List, TypedDict, Literal
 from langgraph.graph import END, StateGraph
 from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_community.document_loaders import PyMuPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_chroma import Chroma
+from langchain_core.runnables import RunnableConfig
 from termcolor import colored
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 from google.api_core.exceptions import ResourceExhausted, ServiceUnavailable
 
-from config import get_embeddings, get_llm, DATA_FOLDER, DB_FOLDER, FILES
+from config import (get_llm, get_embeddings, DATA_FOLDER, WARMUP_IN_BACKGROUND, FACT_FAST_PATH,
+                    GRADER_MODE, GRADER_YES_THRESHOLD, GRADER_NO_THRESHOLD, ROUTER_MODE, ROUTER_MIN_SIMILARITY,
+                    ROUTER_MARGIN)
+from context import pack_context
+from facts import lookup_fact
+from grading import LocalGrader
+from instrumentation import note_retry
+from retrievers import RetrieverRegistry
+from routing import LocalRouter
 
 
+# Only transient API errors are retried; quota errors also slow down every caller
+# through the shared rate limiter (see config.get_rate_limiter).
 retry_logic = retry(
     stop=stop_after_attempt(3),
     wait=wait_exponential(multiplier=1, min=2, max=10),
-    retry=retry_if_exception_type((ResourceExhausted, ServiceUnavailable, Exception))
+    retry=retry_if_exception_type((ResourceExhausted, ServiceUnavailable)),
+    before_sleep=note_retry
 )
 
 
 def initialize_vector_dbs():
-    embeddings = get_embeddings()
-    retrievers = {}
-    
+    """Eagerly open every retriever (kept for scripts that want the old behaviour)."""
     if not os.path.exists(DATA_FOLDER):
         os.makedirs(DATA_FOLDER)
         print(colored(f"⚠️ Put PDFs into {DATA_FOLDER} folder", "red"))
-        return {}
+    return RETRIEVERS.warm()
+
+
+# Retrievers are opened on first use; set WARMUP_IN_BACKGROUND=true to start
+# loading the embedding model and Chroma stores as soon as the module is imported.
+RETRIEVERS = RetrieverRegistry()
+ROUTER = LocalRouter(RETRIEVERS.files, RETRIEVERS.embeddings, RETRIEVERS.catalog.aliases(),
+                     RETRIEVERS.catalog.profiles(), ROUTER_MIN_SIMILARITY, ROUTER_MARGIN)
+# Graded windows go straight to the model: the chunk embedding cache is append-only
+LOCAL_GRADER = LocalGrader(RETRIEVERS.embeddings, GRADER_YES_THRESHOLD, GRADER_NO_THRESHOLD,
+                           window_embeddings_factory=get_embeddings)
+if WARMUP_IN_BACKGROUND:
+    RETRIEVERS.warm(background=True)
 
-    for key, filename in FILES.items():
-        persist_dir = os.path.join(DB_FOLDER, key)
-        file_path = os.path.join(DATA_FOLDER, filename)
-
-        if os.path.exists(persist_dir):
-            print(f"✅ Found existing DB for {key}")
-            vectorstore = Chroma(persist_directory=persist_dir, embedding_function=embeddings)
-        elif os.path.exists(file_path):
-            print(f"🔨 Building index for {key} (This happens once)...")
-            loader = PyMuPDFLoader(file_path)
-            docs = loader.load()
-
-            # TODO (Optional): Clean the data to remove noise (e.g., "\n")
-            # You can write a loop here to replace newlines with spaces
-            # or remove headers/footers.
-            # Example (Dirty data cleanup):
-            # for doc in docs:
-            #     doc.page_content = doc.page_content.replace("\n", " ")
-
-            splitter = RecursiveCharacterTextSplitter(
-                chunk_size=2000,     # <--- can modify
-                chunk_overlap=400,   # <--- can modify 
-                separators=["\n\n", "\n", " ", ""] 
-            )
-            splits = splitter.split_documents(docs)
-            
-            vectorstore = Chroma.from_documents(splits, embeddings, persist_directory=persist_dir)
-        else:
-            print(colored(f"❌ Missing file: {filename}", "red"))
-            continue
-        
-        retrievers[key] = vectorstore.as_retriever(search_kwargs={"k": 3})
-    
-    return retrievers
 
-RETRIEVERS = initialize_vector_dbs()
+def warm(keys=None, background=False):
+    """Open retrievers ahead of the first question (e.g. at worker startup)."""
+    return RETRIEVERS.warm(keys, background=background)
 
 
 class AgentState(TypedDict):
@@ -75,41 +64,45 @@ class AgentState(TypedDict):
     needs_rewrite: str
 
 
+def fact_lookup_node(state: AgentState):
+    """Answer direct line-item lookups from the statement fact index, skipping retrieval and the LLM."""
+    if not FACT_FAST_PATH:
+        return {}
+    print(colored("--- 📒 FACT LOOKUP ---", "cyan"))
+    # Only the named company's filings are checked, so a fresh process does not hash the whole catalog
+    mentioned = ROUTER.matcher.mentioned(state["question"])
+    if len(mentioned) != 1:
+        return {}
+    RETRIEVERS.refresh_facts(mentioned)
+    result = lookup_fact(state["question"], RETRIEVERS.files, RETRIEVERS.catalog.aliases())
+    if result is None:
+        return {}
+    answer, fact = result
+    print(f"   Answered from fact index ({fact['statement']}, page {fact['page'] + 1})")
+    return {"generation": answer}
+
 @retry_logic
-def retrieve_node(state: AgentState):
+def retrieve_node(state: AgentState, config: RunnableConfig):
     print(colored("--- 🔍 RETRIEVING ---", "blue"))
     question = state["question"]
-    llm = get_llm()
-    
-    docs_content = ""
 
     # --- [START] ---
-    
-    # Hint：You can use a prompt like below to guide the LLM
-    # router_prompt = """
-    # Analyze the user question and route it to the correct data source.
-    # Options: "apple", "tesla", "both", "none".
-    # Output only the option name in JSON format: {"datasource": "..."}
-    # Question: {question}
-    # """
-    
-    # TODO: 1. Invoke LLM with router_prompt
-    # TODO: 2. Parse JSON output
-    # TODO: 3. Set `target` variable based on output
-    print(colored("⚠️ WARNING: You need to implement the routing logic", "yellow"))
-    target = "both" # <--- Need to remove this hardcoded line after implementing the above steps and get the target from LLM output
-    
+
+    # Routing runs locally (company names/aliases, then embedding similarity to each
+    # company profile) instead of an LLM call; ROUTER_MODE=both searches everything.
+    if ROUTER_MODE == "both":
+        targets = list(RETRIEVERS.files)
+    else:
+        route = ROUTER.route(question)
+        targets = route.targets
+        scores = ", ".join(f"{key} {score:.2f}" for key, score in route.scores.items())
+        print(f"   Route: {targets or 'none'} via {route.method} ({scores})")
+
     # --- [END] ---
 
-    if target == "apple" or target == "both":
-        if "apple" in RETRIEVERS:
-            docs = RETRIEVERS["apple"].invoke(question)
-            docs_content += "\n\n[Source: Apple 10-K]\n" + "\n".join([d.page_content for d in docs])
-            
-    if target == "tesla" or target == "both":
-        if "tesla" in RETRIEVERS:
-            docs = RETRIEVERS["tesla"].invoke(question)
-            docs_content += "\n\n[Source: Tesla 10-K]\n" + "\n".join([d.page_content for d in docs])
+    docs_content, stats = pack_context(RETRIEVERS.search(question, targets, config))
+    print(f"   Context: {stats['chunks']} chunks -> {stats['packed']}/{stats['passages']} passages, "
+          f"~{stats['tokens']} tokens (raw ~{stats['raw_tokens']})")
 
     return {"documents": docs_content, "search_count": state["search_count"] + 1}
 
@@ -118,6 +111,15 @@ def grade_documents_node(state: AgentState):
     print(colored("--- ⚖️ GRADING ---", "yellow"))
     question = state["question"]
     documents = state["documents"]
+
+    if GRADER_MODE in ("local", "hybrid"):
+        grade, scores = LOCAL_GRADER.grade(question, documents, decide=GRADER_MODE == "local")
+        detail = f"score {scores['score']:.2f}, similarity {scores['similarity']:.2f}, coverage {scores['coverage']:.2f}"
+        if grade is not None:
+            print(f"   Relevance Grade: {grade} (local {detail})")
+            return {"needs_rewrite": grade}
+        print(f"   Local grader unsure ({detail}), asking the LLM")
+
     llm = get_llm()
 
     system_prompt = """You are a grader assessing relevance. 
@@ -178,12 +180,21 @@ def rewrite_node(state: AgentState):
 def build_graph():
     workflow = StateGraph(AgentState)
 
+    workflow.add_node("fact_lookup", fact_lookup_node)
     workflow.add_node("retrieve", retrieve_node)
     workflow.add_node("grade_documents", grade_documents_node)
     workflow.add_node("generate", generate_node)
     workflow.add_node("rewrite", rewrite_node)
 
-    workflow.set_entry_point("retrieve")
+    workflow.set_entry_point("fact_lookup")
+    workflow.add_conditional_edges(
+        "fact_lookup",
+        lambda state: "end" if state["generation"] else "retrieve",
+        {
+            "end": END,
+            "retrieve": "retrieve"
+        },
+    )
     workflow.add_edge("retrieve", "grade_documents")
 
     def decide_to_generate(state):
@@ -209,14 +220,102 @@ def build_graph():
 
     return workflow.compile()
 
-def run_graph_agent(question: str):
-    app = build_graph()
-    inputs = {"question": question, "search_count": 0, "needs_rewrite": "no", "documents": "", "generation": ""}
-    result = app.invoke(inputs)
+_GRAPH = None
+_GRAPH_LOCK = threading.Lock()
+
+def get_graph():
+    """The compiled graph is stateless between runs, so it is built once and shared."""
+    global _GRAPH
+    if _GRAPH is None:
+        with _GRAPH_LOCK:
+            if _GRAPH is None:
+                _GRAPH = build_graph()
+    return _GRAPH
+
+def _initial_state(question: str):
+    return {"question": question, "search_count": 0, "needs_rewrite": "no", "documents": "", "generation": ""}
+
+def run_graph_agent(question: str, callbacks=None):
+    result = get_graph().invoke(_initial_state(question), {"callbacks": callbacks})
     return result["generation"]
 
-def run_legacy_agent(question: str):
-    print(colored("--- 🤖 RUNNING LEGACY AGENT (Linear) ---", "magenta"))
+def run_graph_agent_batch(questions: List[str], max_concurrency: int = 4):
+    """Answer many questions concurrently; answers come back in input order."""
+    results = get_graph().batch(
+        [_initial_state(q) for q in questions],
+        config={"max_concurrency": max_concurrency},
+        return_exceptions=True,
+    )
+    return [f"Graph Agent Error: {r}" if isinstance(r, Exception) else r["generation"] for r in results]
+
+async def arun_graph_agent(question: str, callbacks=None):
+    result = await get_graph().ainvoke(_initial_state(question), {"callbacks": callbacks})
+    return result["generation"]
+
+def _stream_events(mode, payload, state):
+    """Translate one (mode, payload) pair from graph.stream into user-facing events."""
+    if mode == "updates":
+        for node, update in payload.items():
+            yield {"event": "node", "node": node}
+            if update and update.get("generation"):
+                state["answer"] = update["generation"]
+                if not state["streamed"]:  # e.g. the fact fast path: no tokens were streamed
+                    state["ttft_s"] = state["ttft_s"] or time.perf_counter() - state["started"]
+                    yield {"event": "token", "text": update["generation"]}
+    elif mode == "messages":
+        chunk, metadata = payload
+        if metadata.get("langgraph_node") == "generate" and chunk.content:
+            if state["ttft_s"] is None:
+                state["ttft_s"] = time.perf_counter() - state["started"]
+            state["streamed"] = True
+            yield {"event": "token", "text": chunk.content}
+
+def _end_event(state):
+    return {
+        "event": "end",
+        "answer": state["answer"],
+        "ttft_s": state["ttft_s"],
+        "elapsed_s": time.perf_counter() - state["started"],
+    }
+
+def stream_graph_agent(question: str, callbacks=None):
+    """Run the graph and yield events as they happen:
+
+    {"event": "node", "node": ...} when a node finishes, {"event": "token", "text": ...}
+    for each answer chunk as Gemini produces it, and a final {"event": "end", "answer": ...,
+    "ttft_s": ..., "elapsed_s": ...} with the time-to-first-token.
+    """
+    state = {"started": time.perf_counter(), "ttft_s": None, "answer": "", "streamed": False}
+    for mode, payload in get_graph().stream(
+        _initial_state(question), {"callbacks": callbacks}, stream_mode=["updates", "messages"]
+    ):
+        yield from _stream_events(mode, payload, state)
+    yield _end_event(state)
+
+async def astream_graph_agent(question: str, callbacks=None):
+    """Async iterator variant of stream_graph_agent."""
+    state = {"started": time.perf_counter(), "ttft_s": None, "answer": "", "streamed": False}
+    async for mode, payload in get_graph().astream(
+        _initial_state(question), {"callbacks": callbacks}, stream_mode=["updates", "messages"]
+    ):
+        for event in _stream_events(mode, payload, state):
+            yield event
+    yield _end_event(state)
+
+def search_financials(tool_input: str) -> str:
+    """Legacy agent tool: `company: question` -> that company's most relevant passages."""
+    company, _, query = tool_input.partition(":")
+    key = company.strip().lower()
+    if key not in RETRIEVERS.files:
+        mentioned = ROUTER.matcher.mentioned(company) or ROUTER.matcher.mentioned(tool_input)
+        key = mentioned[0] if len(mentioned) == 1 else None
+    if key is None or not RETRIEVERS.is_available(key):
+        return f"Unknown company in {tool_input!r}; use `company: question` with one of {', '.join(RETRIEVERS)}."
+    docs = RETRIEVERS[key].invoke(query.strip() or tool_input)
+    return "\n\n".join(doc.page_content for doc in docs)
+
+def build_legacy_agent():
+    """Build the ReAct AgentExecutor (imports, retriever tools, prompt, agent); None if no tools."""
     AgentExecutor = None
     create_tool_calling_agent = None
     create_retriever_tool = None
@@ -247,22 +346,18 @@ def run_legacy_agent(question: str):
     except ImportError:
         pass
 
-    tools = []
-    if "apple" in RETRIEVERS:
-        tools.append(create_retriever_tool(
-            RETRIEVERS["apple"], 
-            "search_apple_financials", 
-            "Searches Apple's 2024 financial statements."
-        ))
-    if "tesla" in RETRIEVERS:
-        tools.append(create_retriever_tool(
-            RETRIEVERS["tesla"], 
-            "search_tesla_financials", 
-            "Searches Tesla's 2024 10-K report."
-        ))
-
-    if not tools:
-        return "System Error: No tools available."
+    # One tool for the whole catalog: the company is an argument and its retriever opens on first use,
+    # so neither the prompt nor agent startup grows with the number of issuers
+    companies = list(RETRIEVERS)
+    if not companies:
+        return None
+    from langchain_core.tools import Tool
+    tools = [Tool(
+        name="search_financials",
+        func=search_financials,
+        description=("Searches one company's annual report filings. Input format: `company: question`, "
+                     f"where company is one of {', '.join(companies)} (ticker or name also works)."),
+    )]
 
     llm = get_llm()
 
@@ -301,7 +396,7 @@ def run_legacy_agent(question: str):
     
     agent = create_react_agent(llm, tools, prompt)
 
-    agent_executor = AgentExecutor(
+    return AgentExecutor(
             agent=agent, 
             tools=tools, 
             verbose=False,
@@ -309,8 +404,70 @@ def run_legacy_agent(question: str):
             max_iterations=5
     )
 
+_LEGACY_AGENT = None
+_LEGACY_AGENT_ERROR = None      # (exception, time.monotonic() of the failed build)
+_LEGACY_AGENT_LOCK = threading.Lock()
+LEGACY_AGENT_RETRY_S = 30.0     # a build that failed for a transient reason is retried after this long
+# Failures that rebuilding cannot fix: an invalid prompt template, missing langchain agent APIs
+_LEGACY_CONFIG_ERRORS = (ValueError, TypeError, ImportError, NameError)
+
+def get_legacy_agent():
+    """Like the graph, the AgentExecutor keeps no per-question state, so it is built once and shared.
+
+    A build without tools is not cached, so the agent appears once a database does. A
+    configuration error (e.g. the ReAct template above is still empty) is raised again on
+    every call without rebuilding; any other failure (an index or Chroma lock error during
+    warm-up) is retried once LEGACY_AGENT_RETRY_S has passed.
+    """
+    global _LEGACY_AGENT, _LEGACY_AGENT_ERROR
+    if _LEGACY_AGENT is None:
+        with _LEGACY_AGENT_LOCK:
+            error = _LEGACY_AGENT_ERROR
+            retry_due = error is not None and not isinstance(error[0], _LEGACY_CONFIG_ERRORS) \
+                and time.monotonic() - error[1] >= LEGACY_AGENT_RETRY_S
+            if _LEGACY_AGENT is None and (error is None or retry_due):
+                try:
+                    _LEGACY_AGENT = build_legacy_agent()
+                    _LEGACY_AGENT_ERROR = None
+                except Exception as e:
+                    _LEGACY_AGENT_ERROR = (e, time.monotonic())
+    if _LEGACY_AGENT is None and _LEGACY_AGENT_ERROR is not None:
+        error = _LEGACY_AGENT_ERROR[0]
+        raise RuntimeError(f"Legacy agent could not be built: {error}") from error
+    return _LEGACY_AGENT
+
+def _legacy_config(callbacks=None):
+    return {"callbacks": callbacks, "metadata": {"stage": "legacy_agent"}}
+
+def run_legacy_agent(question: str, callbacks=None):
+    print(colored("--- 🤖 RUNNING LEGACY AGENT (Linear) ---", "magenta"))
+    agent_executor = get_legacy_agent()
+    if agent_executor is None:
+        return "System Error: No tools available."
+    try:
+        result = agent_executor.invoke({"input": question}, _legacy_config(callbacks))
+        return result["output"]
+    except Exception as e:
+        return f"Legacy Agent Error: {e}"
+
+def run_legacy_agent_batch(questions: List[str], max_concurrency: int = 4):
+    """Answer many questions concurrently with the shared legacy agent; answers come back in input order."""
+    agent_executor = get_legacy_agent()
+    if agent_executor is None:
+        return ["System Error: No tools available."] * len(questions)
+    results = agent_executor.batch(
+        [{"input": q} for q in questions],
+        config={**_legacy_config(), "max_concurrency": max_concurrency},
+        return_exceptions=True,
+    )
+    return [f"Legacy Agent Error: {r}" if isinstance(r, Exception) else r["output"] for r in results]
+
+async def arun_legacy_agent(question: str, callbacks=None):
+    agent_executor = get_legacy_agent()
+    if agent_executor is None:
+        return "System Error: No tools available."
     try:
-        result = agent_executor.invoke({"input": question})
+        result = await agent_executor.ainvoke({"input": question}, _legacy_config(callbacks))
         return result["output"]
     except Exception as e:
         return f"Legacy Agent Error: {e}"
\ No newline at end of file
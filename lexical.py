@@ -0,0 +1,173 @@
+import json
+import math
+import os
+import re
+from collections import Counter
+from typing import Any, List, Optional
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict
+
+from indexing import stored_id
+
+
+# Numbers keep their separators ("391,035", "4.02") so exact figures match; a comma-free
+# copy is indexed as well so "391035" finds "391,035".
+TOKEN_PATTERN = re.compile(r"\d+(?:[.,]\d+)*|[^\W\d_]+", re.UNICODE)
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it",
+    "of", "on", "or", "that", "the", "this", "to", "was", "were", "what", "which", "with",
+}
+LEXICAL_INDEX_NAME = "lexical.json"
+
+
+def tokenize(text):
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        tokens.append(token)
+        if token[0].isdigit() and "," in token:
+            tokens.append(token.replace(",", ""))
+    return tokens
+
+
+class BM25Index:
+    """Minimal in-process BM25 inverted index over the chunks of one collection."""
+
+    def __init__(self, doc_ids, doc_lens, postings, fingerprint=None, k1=1.5, b=0.75):
+        self.doc_ids = doc_ids
+        self.doc_lens = doc_lens
+        self.postings = postings  # term -> [[doc_index, term_frequency], ...]
+        self.fingerprint = fingerprint
+        self.k1 = k1
+        self.b = b
+        self.avg_len = (sum(doc_lens) / len(doc_lens)) if doc_lens else 0.0
+
+    @classmethod
+    def from_vectorstore(cls, vectorstore, fingerprint=None, page_size=1000, where=None):
+        """Page through a Chroma collection (optionally only the chunks matching `where`)
+        so the full text is never loaded at once."""
+        ids, doc_lens, postings = [], [], {}
+        offset = 0
+        filters = {"where": where} if where else {}
+        while True:
+            page = vectorstore.get(limit=page_size, offset=offset, include=["documents"], **filters)
+            if not page["ids"]:
+                break
+            for doc_id, text in zip(page["ids"], page["documents"]):
+                counts = Counter(tokenize(text or ""))
+                for term, tf in counts.items():
+                    postings.setdefault(term, []).append([len(ids), tf])
+                ids.append(doc_id)
+                doc_lens.append(sum(counts.values()))
+            offset += len(page["ids"])
+        return cls(ids, doc_lens, postings, fingerprint)
+
+    @classmethod
+    def load(cls, path):
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return cls(data["doc_ids"], data["doc_lens"], data["postings"], data.get("fingerprint"))
+
+    def save(self, path):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "fingerprint": self.fingerprint,
+                "doc_ids": self.doc_ids,
+                "doc_lens": self.doc_lens,
+                "postings": self.postings,
+            }, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    def search(self, query, k=20):
+        """Return the top-k (doc_id, score) pairs for `query`."""
+        n_docs = len(self.doc_ids)
+        if not n_docs:
+            return []
+        scores = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for index, tf in postings:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lens[index] / (self.avg_len or 1))
+                scores[index] = scores.get(index, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(self.doc_ids[index], score) for index, score in ranked]
+
+
+class CombinedLexicalIndex:
+    """Several BM25 indexes searched as one, e.g. one per filing of the same company.
+
+    Each index has its own IDF and average length, so raw BM25 scores are not comparable
+    across them; the per-index rankings are fused by rank instead (reciprocal rank fusion).
+    """
+
+    def __init__(self, indexes, rrf_k=60):
+        self.indexes = list(indexes)
+        self.rrf_k = rrf_k
+
+    def search(self, query, k=20):
+        """Return the top-k (doc_id, fused score) pairs for `query`."""
+        rankings = [[doc_id for doc_id, _ in index.search(query, k)] for index in self.indexes]
+        scores = rrf_scores(rankings, self.rrf_k)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+
+def rrf_scores(rankings, rrf_k=60):
+    """Summed 1 / (rrf_k + rank) of every id over several ranked id lists."""
+    fused = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (rrf_k + rank)
+    return fused
+
+
+def reciprocal_rank_fusion(rankings, rrf_k=60):
+    """Fuse several ranked id lists; returns ids sorted by summed 1 / (rrf_k + rank)."""
+    fused = rrf_scores(rankings, rrf_k)
+    return sorted(fused, key=fused.get, reverse=True)
+
+
+class HybridRetriever(BaseRetriever):
+    """Dense similarity search fused with BM25 via reciprocal rank fusion.
+
+    Drop-in for `vectorstore.as_retriever(search_kwargs={"k": k})`: both result lists
+    are fetched `fetch_k` deep and the fused top-k documents are returned. `filter`
+    is pushed down to the dense search; the lexical index is expected to cover only
+    the matching chunks already.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    vectorstore: Any
+    lexical_index: Any
+    k: int = 3
+    fetch_k: int = 20
+    rrf_k: int = 60
+    filter: Optional[dict] = None
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        filters = {"filter": self.filter} if self.filter else {}
+        dense_docs = self.vectorstore.similarity_search(query, k=self.fetch_k, **filters)
+        by_id = {}
+        for doc in dense_docs:
+            by_id.setdefault(stored_id(doc), doc)
+        lexical_ids = [doc_id for doc_id, _ in self.lexical_index.search(query, self.fetch_k)]
+
+        fused = reciprocal_rank_fusion([list(by_id), lexical_ids], self.rrf_k)[:self.k]
+        missing = [doc_id for doc_id in fused if doc_id not in by_id]
+        if missing:
+            found = self.vectorstore.get(ids=missing, include=["documents", "metadatas"])
+            for doc_id, text, metadata in zip(found["ids"], found["documents"], found["metadatas"]):
+                by_id[doc_id] = Document(id=doc_id, page_content=text, metadata=metadata or {})
+        return [by_id[doc_id] for doc_id in fused if doc_id in by_id]
@@ -0,0 +1,160 @@
+import hashlib
+import json
+import os
+import re
+import time
+from typing import Any, Iterator, List, Optional
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+class CassetteMiss(LookupError):
+    """Replay mode was asked for a prompt that was never recorded (and stubs are disabled)."""
+
+
+def _message_text(message):
+    content = message.content
+    if isinstance(content, list):
+        content = "".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
+    return content
+
+
+def _truncate_at_stop(text, stop):
+    for token in stop or []:
+        index = text.find(token)
+        if index != -1:
+            text = text[:index]
+    return text
+
+
+def _keywords(text):
+    return {w for w in re.findall(r"[a-z0-9][a-z0-9,.&-]*", text.lower()) if len(w) > 3}
+
+
+def stub_response(messages, companies=("apple", "tesla")):
+    """Deterministic rule-based answer for the prompts this repo sends.
+
+    Good enough to drive the router, grader, rewriter, judge and ReAct loop offline;
+    anything else gets a short generic answer.
+    """
+    system = " ".join(_message_text(m) for m in messages if m.type == "system").lower()
+    human = "\n".join(_message_text(m) for m in messages if m.type != "system")
+    text = f"{system}\n{human}".lower()
+
+    if "datasource" in text:
+        question = human.rsplit("Question:", 1)[-1].lower()
+        hits = [c for c in companies if c in question]
+        return json.dumps({"datasource": hits[0] if len(hits) == 1 else ("both" if hits else "none")})
+    if "grader assessing relevance" in text:
+        context, _, question = human.partition("User question:")
+        return "yes" if _keywords(question) & _keywords(context) else "no"
+    if "rephrase this question" in text:
+        match = re.search(r"search for '(.*)' yielded", human, re.DOTALL)
+        return (match.group(1) if match else human).strip()
+    if "strict grading assistant" in text:
+        return "PASS"
+    if "final answer" in text and "action input" in text:
+        return "Thought: I can answer from what I already know.\nFinal Answer: I don't know based on the available filings."
+    if "context:" in text:
+        context = system.split("context:", 1)[-1].strip()
+        return (context[:400] + " [Source: replay stub]") if context else "I don't know."
+    return "I don't know."
+
+
+class CassetteChatModel(BaseChatModel):
+    """Chat model that records real responses to cassette files or replays them offline.
+
+    mode="record": every call goes to `inner` and the response is written to
+    `<cassette_dir>/<key>.json`. mode="replay": responses are served from the
+    cassettes after `latency_s` (+ `latency_per_token_s` per output token) so
+    benchmarks keep a realistic shape; unrecorded prompts fall back to
+    `stub_response` when `use_stub` is set, otherwise raise CassetteMiss.
+    The key covers model name, temperature, stop sequences and every message.
+    """
+
+    mode: str = "replay"
+    model_name: str = "gemini-2.0-flash"
+    temperature: float = 0.0
+    cassette_dir: str = "cassettes"
+    inner: Optional[Any] = None
+    latency_s: float = 0.0
+    latency_per_token_s: float = 0.0
+    use_stub: bool = True
+
+    @property
+    def _llm_type(self) -> str:
+        return "cassette"
+
+    @property
+    def _identifying_params(self):
+        return {"model_name": self.model_name, "temperature": self.temperature, "mode": self.mode}
+
+    def _key(self, messages, stop):
+        payload = json.dumps({
+            "model": self.model_name,
+            "temperature": self.temperature,
+            "stop": list(stop or []),
+            "messages": [[m.type, _message_text(m)] for m in messages],
+        }, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cassette_dir, f"{key}.json")
+
+    def _record(self, messages, stop, key):
+        response = self.inner.invoke(messages, stop=stop)
+        os.makedirs(self.cassette_dir, exist_ok=True)
+        entry = {
+            "model": self.model_name,
+            "messages": [[m.type, _message_text(m)] for m in messages],
+            "content": _message_text(response),
+            "usage_metadata": getattr(response, "usage_metadata", None),
+        }
+        tmp_path = self._path(key) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self._path(key))
+        return entry
+
+    def _replay(self, messages, stop, key):
+        path = self._path(key)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        if not self.use_stub:
+            raise CassetteMiss(f"No cassette for prompt {key[:12]} in {self.cassette_dir}")
+        return {"content": _truncate_at_stop(stub_response(messages), stop), "usage_metadata": None}
+
+    def _entry(self, messages, stop):
+        key = self._key(messages, stop)
+        if self.mode == "record":
+            return self._record(messages, stop, key)
+        return self._replay(messages, stop, key)
+
+    def _generate(self, messages: List, stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> ChatResult:
+        entry = self._entry(messages, stop)
+        if self.mode == "replay":
+            delay = self.latency_s + len(entry["content"]) // 4 * self.latency_per_token_s
+            if delay > 0:
+                time.sleep(delay)
+        message = AIMessage(content=entry["content"])
+        if entry.get("usage_metadata"):
+            message.usage_metadata = entry["usage_metadata"]
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages: List, stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        """Replay the response word by word: `latency_s` before the first chunk, then per-token pacing."""
+        entry = self._entry(messages, stop)
+        if self.mode == "replay" and self.latency_s > 0:
+            time.sleep(self.latency_s)
+        pieces = re.findall(r"\S+\s*|\s+", entry["content"]) or [""]
+        for index, piece in enumerate(pieces):
+            if self.mode == "replay" and self.latency_per_token_s > 0:
+                time.sleep(max(1, len(piece) // 4) * self.latency_per_token_s)
+            chunk = AIMessageChunk(content=piece)
+            if index == len(pieces) - 1 and entry.get("usage_metadata"):
+                chunk.usage_metadata = entry["usage_metadata"]
+            if run_manager:
+                run_manager.on_llm_new_token(piece, chunk=ChatGenerationChunk(message=chunk))
+            yield ChatGenerationChunk(message=chunk)
@@ -0,0 +1,180 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+
+from rate_limit import CACHED_FLAG
+
+
+class DiskLLMCache(BaseCache):
+    """Persistent LangChain LLM cache backed by SQLite.
+
+    LangChain calls `lookup(prompt, llm_string)` before every chat model request,
+    where `prompt` is the serialized message list and `llm_string` encodes the
+    model name, temperature and other call parameters, so an exact hit means the
+    same model would have been sent the same messages. With `semantic_threshold`
+    set, a miss falls back to a cached prompt whose earlier messages (system text,
+    context) are identical and whose final message is the most similar by cosine
+    (local embedding model), if that similarity clears the threshold. Only the final
+    message is embedded, and only when it is short enough for the embedding model to
+    see all of it; anything longer is matched exactly or not at all.
+    """
+
+    SEMANTIC_MAX_CHARS = 400   # MiniLM stops reading after 128 tokens
+
+    def __init__(self, path, max_entries=10000, ttl_seconds=None, semantic_threshold=None, embeddings_factory=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.semantic_threshold = semantic_threshold
+        self._embeddings_factory = embeddings_factory
+        self._embeddings = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY, llm_string TEXT, prompt TEXT, response TEXT,
+                embedding BLOB, created REAL, last_used REAL, prefix_key TEXT)""")
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(llm_cache)")}
+            if "prefix_key" not in columns:
+                # Older caches embedded the whole prompt; their rows stay exact-match only
+                conn.execute("ALTER TABLE llm_cache ADD COLUMN prefix_key TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_llm ON llm_cache (llm_string)")
+            conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_prefix ON llm_cache (prefix_key)")
+            conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_last_used ON llm_cache (last_used)")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _key(prompt, llm_string):
+        return hashlib.sha256(f"{llm_string}\x00{prompt}".encode("utf-8")).hexdigest()
+
+    def _semantic_key(self, prompt, llm_string):
+        """(hash of llm_string + every message but the last, last message text), or None if not comparable."""
+        try:
+            contents = [str(m.get("kwargs", {}).get("content", "")) for m in json.loads(prompt)]
+        except (ValueError, AttributeError, TypeError):
+            return None
+        if not contents or len(contents[-1]) > self.SEMANTIC_MAX_CHARS:
+            return None
+        prefix = "\x00".join(contents[:-1])
+        return self._key(prefix, llm_string), contents[-1]
+
+    def _embed(self, text):
+        if self._embeddings is None:
+            self._embeddings = self._embeddings_factory()
+        vector = np.asarray(self._embeddings.embed_query(text), dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    @staticmethod
+    def _load(response):
+        """Deserialize cached generations, marked so usage accounting can tell them from API calls."""
+        generations = [loads(g) for g in json.loads(response)]
+        for generation in generations:
+            generation.generation_info = {**(generation.generation_info or {}), CACHED_FLAG: True}
+        return generations
+
+    def _expired(self, created, now):
+        return self.ttl_seconds is not None and now - created > self.ttl_seconds
+
+    def lookup(self, prompt, llm_string):
+        conn = self._conn()
+        now = time.time()
+        key = self._key(prompt, llm_string)
+        row = conn.execute("SELECT response, created FROM llm_cache WHERE key = ?", (key,)).fetchone()
+        if row is not None and not self._expired(row[1], now):
+            with conn:
+                conn.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (now, key))
+            with self._lock:
+                self.hits += 1
+            return self._load(row[0])
+
+        if self.semantic_threshold is not None and self._embeddings_factory is not None:
+            match = self._semantic_lookup(conn, prompt, llm_string, now)
+            if match is not None:
+                with self._lock:
+                    self.semantic_hits += 1
+                return match
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _semantic_lookup(self, conn, prompt, llm_string, now):
+        semantic_key = self._semantic_key(prompt, llm_string)
+        if semantic_key is None:
+            return None
+        prefix_key, text = semantic_key
+        rows = conn.execute(
+            "SELECT key, response, embedding, created FROM llm_cache WHERE prefix_key = ? AND embedding IS NOT NULL",
+            (prefix_key,),
+        ).fetchall()
+        rows = [row for row in rows if not self._expired(row[3], now)]
+        if not rows:
+            return None
+        query = self._embed(text)
+        matrix = np.stack([np.frombuffer(row[2], dtype=np.float32) for row in rows])
+        scores = matrix @ query
+        best = int(np.argmax(scores))
+        if scores[best] < self.semantic_threshold:
+            return None
+        with conn:
+            conn.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (now, rows[best][0]))
+        return self._load(rows[best][1])
+
+    def update(self, prompt, llm_string, return_val):
+        conn = self._conn()
+        now = time.time()
+        embedding = prefix_key = None
+        if self.semantic_threshold is not None and self._embeddings_factory is not None:
+            semantic_key = self._semantic_key(prompt, llm_string)
+            if semantic_key is not None:
+                prefix_key, text = semantic_key
+                embedding = self._embed(text).tobytes()
+        response = json.dumps([dumps(g) for g in return_val])
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, llm_string, prompt, response, embedding, created, last_used, "
+                "prefix_key) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (self._key(prompt, llm_string), llm_string, prompt, response, embedding, now, now, prefix_key),
+            )
+            self._evict(conn, now)
+
+    def _evict(self, conn, now):
+        if self.ttl_seconds is not None:
+            conn.execute("DELETE FROM llm_cache WHERE created < ?", (now - self.ttl_seconds,))
+        if self.max_entries is not None:
+            conn.execute(
+                "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def clear(self, **kwargs):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM llm_cache")
+
+    def stats(self):
+        size = self._conn().execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        lookups = self.hits + self.semantic_hits + self.misses
+        return {
+            "entries": size,
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.semantic_hits) / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,93 @@
+import argparse
+import json
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from termcolor import colored
+
+from config import SERVICE_HOST, SERVICE_PORT
+from instrumentation import load_workload, percentile
+
+
+def post(url, payload, timeout):
+    """POST JSON; returns (status, decoded body). HTTP errors are results, not exceptions."""
+    request = urllib.request.Request(url, json.dumps(payload).encode("utf-8"),
+                                     {"Content-Type": "application/json"}, method="POST")
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read() or b"{}")
+
+
+def get(url, timeout=10):
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return json.loads(e.read() or b"{}")
+
+
+def replay(base_url, questions, agent="graph", concurrency=8, repeat=1, rate=0.0, timeout=300):
+    """Send every question `repeat` times from `concurrency` clients.
+
+    With `rate` > 0 requests start on a fixed schedule (open loop, requests per second)
+    so queueing shows up as latency; otherwise each client sends its next question as
+    soon as the previous one is answered (closed loop).
+    """
+    workload = [item for _ in range(repeat) for item in questions]
+    started = time.perf_counter()
+
+    def _send(indexed):
+        index, (name, question) = indexed
+        if rate > 0:
+            time.sleep(max(0.0, started + index / rate - time.perf_counter()))
+        sent = time.perf_counter()
+        try:
+            status, body = post(f"{base_url}/ask", {"question": question, "agent": agent}, timeout)
+        except OSError as e:
+            status, body = 0, {"error": str(e)}
+        return {"name": name, "status": status, "seconds": time.perf_counter() - sent,
+                "coalesced": bool(body.get("coalesced")), "error": body.get("error")}
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(_send, enumerate(workload)))
+    return results, time.perf_counter() - started
+
+
+def print_results(results, wall):
+    statuses = Counter(r["status"] for r in results)
+    ok = [r["seconds"] for r in results if r["status"] == 200]
+    print(colored(f"\n📈 {len(results)} requests in {wall:.2f}s ({len(results) / wall if wall else 0:.2f} req/s), "
+                  f"{len(ok)} answered ({len(ok) / wall if wall else 0:.2f} answers/s)", "cyan", attrs=["bold"]))
+    print("   status " + "  ".join(f"{status or 'conn-error'}: {count}" for status, count in sorted(statuses.items())))
+    if ok:
+        print(f"   latency p50 {percentile(ok, 50):.3f}s  p95 {percentile(ok, 95):.3f}s  p99 {percentile(ok, 99):.3f}s"
+              f"  coalesced {sum(r['coalesced'] for r in results)}")
+    failed = [r for r in results if r["status"] != 200]
+    if failed:
+        print(colored(f"   first failure: {failed[0]['name']}: {failed[0]['error']}", "red"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a JSONL workload against service.py.")
+    parser.add_argument("workload", nargs="?", default="requests.jsonl",
+                        help="JSONL with `question` (or `body`/`title`) per line")
+    parser.add_argument("--url", default=f"http://{SERVICE_HOST}:{SERVICE_PORT}")
+    parser.add_argument("--agent", choices=["graph", "legacy"], default="graph")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=1, help="send the workload this many times")
+    parser.add_argument("--rate", type=float, default=0.0, help="requests per second (0 = closed loop)")
+    parser.add_argument("--limit", type=int, help="only the first N questions")
+    parser.add_argument("--timeout", type=float, default=300.0)
+    args = parser.parse_args()
+
+    questions = load_workload(args.workload)[:args.limit]
+    print(f"🎯 {args.url}: {len(questions)} questions x{args.repeat}, concurrency {args.concurrency}"
+          + (f", {args.rate:g} req/s" if args.rate else ""))
+    print(f"   health: {get(args.url + '/health')}")
+    results, wall = replay(args.url, questions, args.agent, args.concurrency, args.repeat, args.rate, args.timeout)
+    print_results(results, wall)
+    print(f"   server metrics: {json.dumps(get(args.url + '/metrics'), indent=2)}")
@@ -0,0 +1,309 @@
+import json
+import mmap
+import os
+import shutil
+import tempfile
+import threading
+from typing import Any, List, Optional, Tuple
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+
+MMAP_INDEX_NAME = "mmap_index"
+MMAP_INDEX_VERSION = 1
+
+
+class ReadOnlyStoreError(Exception):
+    """Raised when adding to or deleting from an MmapVectorStore; build a new one instead."""
+
+
+def matches_filter(metadata, where):
+    """Evaluate a Chroma-style metadata filter: {"field": value}, {"field": {"$eq"|"$ne"|"$in"|"$nin": ...}}
+    and "$and"/"$or" lists of those. Other operators raise NotImplementedError."""
+    for field, condition in where.items():
+        if field in ("$and", "$or"):
+            results = (matches_filter(metadata, clause) for clause in condition)
+            if not (all(results) if field == "$and" else any(results)):
+                return False
+            continue
+        if field.startswith("$"):
+            raise NotImplementedError(f"MmapVectorStore filters do not support {field}")
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        value = metadata.get(field)
+        for operator, operand in condition.items():
+            if operator == "$eq":
+                ok = value == operand
+            elif operator == "$ne":
+                ok = value != operand
+            elif operator == "$in":
+                ok = value in operand
+            elif operator == "$nin":
+                ok = value not in operand
+            else:
+                raise NotImplementedError(f"MmapVectorStore filters do not support {operator}")
+            if not ok:
+                return False
+    return True
+
+
+def _check_kwargs(kwargs):
+    """Reject search options this store would otherwise silently ignore; returns the filter (or None)."""
+    unknown = set(kwargs) - {"filter"}
+    if unknown:
+        raise NotImplementedError(f"MmapVectorStore does not support {', '.join(sorted(unknown))}")
+    return kwargs.get("filter") or None
+
+
+def _normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1.0, norms)
+
+
+def kmeans(vectors, n_clusters, iterations=12, seed=0):
+    """Spherical k-means on unit vectors; returns (centroids, labels)."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    labels = np.zeros(len(vectors), dtype=np.int64)
+    for _ in range(iterations):
+        labels = np.argmax(vectors @ centroids.T, axis=1)
+        for cluster in range(n_clusters):
+            members = vectors[labels == cluster]
+            if len(members):
+                centroids[cluster] = members.mean(axis=0)
+            else:  # re-seed empty clusters with the worst-served vector
+                centroids[cluster] = vectors[np.argmin(np.max(vectors @ centroids.T, axis=1))]
+        centroids = _normalize(centroids)
+    return centroids, np.argmax(vectors @ centroids.T, axis=1)
+
+
+class MmapVectorStore(VectorStore):
+    """Read-only vector store over a memory-mapped int8/float16 matrix with an IVF index.
+
+    Layout under `<persist_dir>/mmap_index/`:
+      meta.json        - dim, dtype, row count, IVF list count, index fingerprint
+      vectors.bin      - unit vectors, rows grouped by IVF list (int8 rows carry a scale)
+      scales.bin       - float32 per-row dequantization scale (int8 only)
+      centroids.npy    - float32 IVF centroids; offsets.npy - row range of each list
+      docs.jsonl       - {"id", "text", "metadata"} per row; doc_offsets.npy - byte offsets
+
+    Every file is opened with mmap, so worker processes serving the same index share
+    its pages through the OS page cache instead of each holding a copy. A search scores
+    the `nprobe` lists whose centroids are closest to the query; a Chroma-style metadata
+    `filter` is applied to those candidates. The store is built from
+    an existing collection (`from_vectorstore`) or from texts, and rebuilt, not
+    updated, when the collection changes.
+    """
+
+    def __init__(self, path, embedding, nprobe=None):
+        self.path = path
+        self.embedding = embedding
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.fingerprint = self.meta.get("fingerprint")
+        count, dim = self.meta["count"], self.meta["dim"]
+        self.dtype = np.dtype(self.meta["dtype"])
+        self.vectors = np.memmap(os.path.join(path, "vectors.bin"), dtype=self.dtype, mode="r", shape=(count, dim)) \
+            if count else np.zeros((0, dim), dtype=self.dtype)
+        self.scales = np.memmap(os.path.join(path, "scales.bin"), dtype=np.float32, mode="r", shape=(count,)) \
+            if count and self.dtype == np.int8 else None
+        self.centroids = np.load(os.path.join(path, "centroids.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(path, "offsets.npy"))
+        self.doc_offsets = np.load(os.path.join(path, "doc_offsets.npy"), mmap_mode="r")
+        self.nprobe = nprobe or max(1, int(np.ceil(len(self.centroids) / 4)))
+        self._docs_file = open(os.path.join(path, "docs.jsonl"), "rb")
+        self._docs = mmap.mmap(self._docs_file.fileno(), 0, access=mmap.ACCESS_READ) if count else b""
+        self._ids = None
+        self._lock = threading.Lock()
+
+    @property
+    def embeddings(self):
+        return self.embedding
+
+    def __len__(self):
+        return self.meta["count"]
+
+    @classmethod
+    def load(cls, path, embedding, nprobe=None):
+        """Open the store at `path`, or return None if it is missing or from an older layout."""
+        try:
+            with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+                if json.load(f).get("version") != MMAP_INDEX_VERSION:
+                    return None
+            return cls(path, embedding, nprobe)
+        except (OSError, ValueError, KeyError):
+            return None
+
+    @classmethod
+    def build(cls, path, ids, vectors, texts, metadatas, embedding, dtype="int8", n_lists=None, fingerprint=None,
+              nprobe=None):
+        """Write a new store at `path` (replacing any previous one) and open it."""
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+        count, dim = vectors.shape if len(vectors) else (0, len(embedding.embed_query("dimension probe")))
+        n_lists = min(count, n_lists or max(1, int(np.sqrt(count)))) if count else 0
+        if count:
+            centroids, labels = kmeans(vectors, n_lists)
+            order = np.argsort(labels, kind="stable")
+            offsets = np.searchsorted(labels[order], np.arange(n_lists + 1))
+        else:
+            centroids, order, offsets = np.zeros((0, dim), dtype=np.float32), np.zeros(0, dtype=np.int64), np.zeros(1)
+
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        # A private scratch directory per build, so concurrent builders never write into each other's files
+        tmp_path = tempfile.mkdtemp(prefix=os.path.basename(path) + ".tmp-", dir=parent)
+        try:
+            cls._write(tmp_path, ids, vectors, texts, metadatas, dtype, dim, count, n_lists, centroids, order,
+                       offsets, fingerprint)
+        except BaseException:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+
+        # Opened before the swap: every file is mapped, so the store stays readable even if another
+        # builder replaces `path` right after
+        store = cls(tmp_path, embedding, nprobe)
+        store.path = path
+        old_path = tmp_path + ".old"
+        if os.path.exists(path):
+            try:
+                os.replace(path, old_path)
+            except FileNotFoundError:
+                pass  # another builder swapped it out first
+        try:
+            os.replace(tmp_path, path)
+        except OSError:
+            # Another builder installed its copy in between; it was built from the same chunks
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        shutil.rmtree(old_path, ignore_errors=True)
+        return store
+
+    @staticmethod
+    def _write(tmp_path, ids, vectors, texts, metadatas, dtype, dim, count, n_lists, centroids, order, offsets,
+               fingerprint):
+        ordered = vectors[order]
+        if np.dtype(dtype) == np.int8:
+            scales = np.abs(ordered).max(axis=1) / 127.0 if count else np.zeros(0)
+            scales[scales == 0] = 1.0
+            np.round(ordered / scales[:, None]).astype(np.int8).tofile(os.path.join(tmp_path, "vectors.bin"))
+            scales.astype(np.float32).tofile(os.path.join(tmp_path, "scales.bin"))
+        else:
+            ordered.astype(dtype).tofile(os.path.join(tmp_path, "vectors.bin"))
+        np.save(os.path.join(tmp_path, "centroids.npy"), centroids.astype(np.float32))
+        np.save(os.path.join(tmp_path, "offsets.npy"), np.asarray(offsets, dtype=np.int64))
+
+        doc_offsets, position = [], 0
+        with open(os.path.join(tmp_path, "docs.jsonl"), "wb") as f:
+            for row in order:
+                line = json.dumps({"id": ids[row], "text": texts[row], "metadata": metadatas[row] or {}},
+                                  ensure_ascii=False).encode("utf-8") + b"\n"
+                doc_offsets.append(position)
+                position += f.write(line)
+        doc_offsets.append(position)
+        np.save(os.path.join(tmp_path, "doc_offsets.npy"), np.asarray(doc_offsets, dtype=np.int64))
+        with open(os.path.join(tmp_path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"version": MMAP_INDEX_VERSION, "dim": int(dim), "dtype": np.dtype(dtype).name,
+                       "count": int(count), "lists": int(n_lists), "fingerprint": fingerprint}, f)
+
+    @classmethod
+    def from_vectorstore(cls, vectorstore, path, embedding, dtype="int8", fingerprint=None, nprobe=None,
+                         page_size=1000):
+        """Export a Chroma collection's stored embeddings (nothing is re-embedded) into a new store."""
+        ids, vectors, texts, metadatas = [], [], [], []
+        offset = 0
+        while True:
+            page = vectorstore.get(limit=page_size, offset=offset, include=["embeddings", "documents", "metadatas"])
+            if not len(page["ids"]):
+                break
+            ids.extend(page["ids"])
+            vectors.extend(page["embeddings"])
+            texts.extend(page["documents"])
+            metadatas.extend(page["metadatas"])
+            offset += len(page["ids"])
+        return cls.build(path, ids, vectors, texts, metadatas, embedding, dtype, fingerprint=fingerprint,
+                         nprobe=nprobe)
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding, metadatas: Optional[List[dict]] = None, *,
+                   ids: Optional[List[str]] = None, persist_directory: str = MMAP_INDEX_NAME, dtype="int8", **kwargs):
+        texts = list(texts)
+        ids = ids or [str(i) for i in range(len(texts))]
+        return cls.build(persist_directory, ids, embedding.embed_documents(texts), texts,
+                         metadatas or [{} for _ in texts], embedding, dtype, **kwargs)
+
+    def add_texts(self, texts, metadatas=None, **kwargs):
+        raise ReadOnlyStoreError("MmapVectorStore is read-only; rebuild it with from_vectorstore()/from_texts().")
+
+    def delete(self, ids=None, **kwargs):
+        raise ReadOnlyStoreError("MmapVectorStore is read-only; rebuild it with from_vectorstore()/from_texts().")
+
+    def _document(self, row):
+        start, end = int(self.doc_offsets[row]), int(self.doc_offsets[row + 1])
+        record = json.loads(self._docs[start:end])
+        return Document(id=record["id"], page_content=record["text"], metadata=record["metadata"])
+
+    def _row_ids(self):
+        if self._ids is None:
+            with self._lock:
+                if self._ids is None:
+                    self._ids = {self._document(row).id: row for row in range(len(self))}
+        return self._ids
+
+    def _scores(self, start, end, query):
+        block = self.vectors[start:end].astype(np.float32) @ query
+        return block * self.scales[start:end] if self.scales is not None else block
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4,
+                                               filter: Optional[dict] = None) -> List[Tuple[Document, float]]:
+        """Top-k rows of the `nprobe` nearest lists; with a metadata `filter` only matching rows count."""
+        if not len(self):
+            return []
+        query = _normalize(np.asarray(embedding, dtype=np.float32))
+        lists = np.argsort(-(self.centroids @ query))[:self.nprobe]
+        rows, scores = [], []
+        for cluster in lists:
+            start, end = int(self.offsets[cluster]), int(self.offsets[cluster + 1])
+            if end > start:
+                rows.append(np.arange(start, end))
+                scores.append(self._scores(start, end, query))
+        rows, scores = np.concatenate(rows), np.concatenate(scores)
+        if filter:
+            # Candidates are decoded best first until k of them match
+            results = []
+            for i in np.argsort(-scores):
+                doc = self._document(int(rows[i]))
+                if matches_filter(doc.metadata, filter):
+                    results.append((doc, float(scores[i])))
+                    if len(results) == k:
+                        break
+            return results
+        top = np.argsort(-scores)[:k] if len(scores) <= k else np.argpartition(-scores, k)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self._document(int(rows[i])), float(scores[i])) for i in top]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k, _check_kwargs(kwargs))]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self.embedding.embed_query(query), k, _check_kwargs(kwargs))
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    def _select_relevance_score_fn(self):
+        return lambda score: score  # already a cosine similarity
+
+    def get(self, ids=None, where=None, limit=None, offset=0, include=None):
+        """Chroma-style `get` (ids/documents/metadatas) used by the lexical index and hybrid retriever."""
+        if ids is not None:
+            row_ids = self._row_ids()
+            docs = [self._document(row_ids[doc_id]) for doc_id in ids if doc_id in row_ids]
+            docs = [doc for doc in docs if not where or matches_filter(doc.metadata, where)]
+        elif where:
+            docs = [doc for doc in map(self._document, range(len(self))) if matches_filter(doc.metadata, where)]
+            docs = docs[offset:None if limit is None else offset + limit]
+        else:
+            end = len(self) if limit is None else min(len(self), offset + limit)
+            docs = [self._document(row) for row in range(offset, end)]
+        return {"ids": [d.id for d in docs], "documents": [d.page_content for d in docs],
+                "metadatas": [d.metadata for d in docs]}
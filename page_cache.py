@@ -0,0 +1,69 @@
+import json
+import os
+import sqlite3
+import threading
+
+
+class PageCache:
+    """Parsed PDF pages keyed by (file hash, page number), stored in SQLite.
+
+    Each row keeps the page text exactly as the splitter receives it plus its layout:
+    text blocks as [x0, y0, x1, y1, text] and detected tables as
+    {"bbox": [...], "rows": [[cell, ...], ...]}. A file is only served from the cache
+    once all of its pages were stored (`complete`), so an interrupted parse is
+    simply redone.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS pages (
+                file_hash TEXT, page INTEGER, total_pages INTEGER, text TEXT, blocks TEXT, tables TEXT,
+                PRIMARY KEY (file_hash, page))""")
+            conn.execute("CREATE TABLE IF NOT EXISTS files (file_hash TEXT PRIMARY KEY, page_count INTEGER, complete INTEGER)")
+            self._local.conn = conn
+        return conn
+
+    def is_complete(self, file_hash):
+        row = self._conn().execute("SELECT complete FROM files WHERE file_hash = ?", (file_hash,)).fetchone()
+        return bool(row and row[0])
+
+    def iter_pages(self, file_hash):
+        """Yield (page, text, total_pages) in page order, one row at a time."""
+        cursor = self._conn().execute(
+            "SELECT page, text, total_pages FROM pages WHERE file_hash = ? ORDER BY page", (file_hash,))
+        yield from cursor
+
+    def put_pages(self, file_hash, records):
+        """Store parsed pages given as (page, text, total_pages, blocks, tables)."""
+        conn = self._conn()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?)",
+                [(file_hash, page, total, text, json.dumps(blocks), json.dumps(tables))
+                 for page, text, total, blocks, tables in records],
+            )
+
+    def mark_complete(self, file_hash, page_count):
+        conn = self._conn()
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO files VALUES (?, ?, 1)", (file_hash, page_count))
+
+    def layout(self, file_hash, page):
+        """Return {"blocks": [...], "tables": [...]} for one cached page, or None."""
+        row = self._conn().execute(
+            "SELECT blocks, tables FROM pages WHERE file_hash = ? AND page = ?", (file_hash, page)).fetchone()
+        return None if row is None else {"blocks": json.loads(row[0]), "tables": json.loads(row[1])}
+
+    def forget(self, file_hash):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM pages WHERE file_hash = ?", (file_hash,))
+            conn.execute("DELETE FROM files WHERE file_hash = ?", (file_hash,))
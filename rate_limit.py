@@ -0,0 +1,161 @@
+import asyncio
+import threading
+import time
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.rate_limiters import BaseRateLimiter
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at `per_minute / 60` per second.
+
+    The balance may go negative ("debt") when usage is only known after the fact,
+    e.g. tokens consumed by a response; new work waits until it is paid back.
+    """
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now, multiplier=1.0):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate * multiplier)
+        self.updated = now
+
+    def wait_time(self, amount, multiplier=1.0):
+        missing = amount - self.tokens
+        return 0.0 if missing <= 0 else missing / (self.rate * multiplier)
+
+
+class AdaptiveRateLimiter(BaseRateLimiter):
+    """Requests-per-minute and tokens-per-minute budget shared by every LLM call.
+
+    Plugged into chat models through LangChain's `rate_limiter` hook (cache hits skip
+    it). When the API still answers with a quota error, `penalize()` pauses all
+    callers for an exponentially growing cooldown and slows both buckets down; each
+    successful call lets the rate recover towards the configured budget.
+    """
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None, min_multiplier=0.1, recovery=1.1,
+                 base_cooldown=2.0, max_cooldown=60.0):
+        self._lock = threading.Lock()
+        self.min_multiplier = min_multiplier
+        self.recovery = recovery
+        self.base_cooldown = base_cooldown
+        self.max_cooldown = max_cooldown
+        self.configure(requests_per_minute, tokens_per_minute)
+
+    def configure(self, requests_per_minute=None, tokens_per_minute=None):
+        with self._lock:
+            self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+            self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+            self.multiplier = 1.0
+            self.cooldown_until = 0.0
+            self.strikes = 0
+            self.throttled_seconds = 0.0
+            self.penalties = 0
+
+    def _try_acquire(self):
+        """Take one request slot if possible; otherwise return how long to wait."""
+        with self._lock:
+            now = time.monotonic()
+            wait = self.cooldown_until - now
+            for bucket, amount in ((self.requests, 1.0), (self.tokens, 0.0)):
+                if bucket is not None:
+                    bucket.refill(now, self.multiplier)
+                    wait = max(wait, bucket.wait_time(amount, self.multiplier))
+            if wait <= 0:
+                if self.requests is not None:
+                    self.requests.tokens -= 1.0
+                return 0.0
+            return wait
+
+    def acquire(self, *, blocking=True):
+        while True:
+            wait = self._try_acquire()
+            if wait <= 0:
+                return True
+            if not blocking:
+                return False
+            pause = min(wait, 1.0)
+            with self._lock:
+                self.throttled_seconds += pause
+            time.sleep(pause)
+
+    async def aacquire(self, *, blocking=True):
+        while True:
+            wait = self._try_acquire()
+            if wait <= 0:
+                return True
+            if not blocking:
+                return False
+            pause = min(wait, 1.0)
+            with self._lock:
+                self.throttled_seconds += pause
+            await asyncio.sleep(pause)
+
+    def record_tokens(self, count):
+        with self._lock:
+            if self.tokens is not None:
+                self.tokens.refill(time.monotonic(), self.multiplier)
+                self.tokens.tokens -= count
+
+    def record_success(self):
+        with self._lock:
+            self.strikes = 0
+            self.multiplier = min(1.0, self.multiplier * self.recovery)
+
+    def penalize(self):
+        with self._lock:
+            self.penalties += 1
+            self.strikes += 1
+            self.multiplier = max(self.min_multiplier, self.multiplier * 0.5)
+            cooldown = min(self.max_cooldown, self.base_cooldown * 2 ** (self.strikes - 1))
+            self.cooldown_until = max(self.cooldown_until, time.monotonic() + cooldown)
+
+    def stats(self):
+        return {
+            "multiplier": round(self.multiplier, 3),
+            "penalties": self.penalties,
+            "throttled_seconds": round(self.throttled_seconds, 2),
+        }
+
+
+# generation_info key set on generations served from the LLM cache (see llm_cache.DiskLLMCache.lookup)
+CACHED_FLAG = "from_cache"
+
+
+def is_rate_limit_error(error):
+    text = f"{type(error).__name__} {error}"
+    return "ResourceExhausted" in text or "429" in text or "quota" in text.lower()
+
+
+class RateLimitCallbackHandler(BaseCallbackHandler):
+    """Feeds actual token usage and quota errors back into an AdaptiveRateLimiter.
+
+    LangChain also fires on_llm_end for cache hits; generations served from the cache
+    (marked by llm_cache.DiskLLMCache) cost no quota and are not a sign of API health,
+    so they are ignored.
+    """
+
+    def __init__(self, limiter):
+        self.limiter = limiter
+
+    def on_llm_end(self, response, **kwargs):
+        generations = [generation for batch in response.generations for generation in batch
+                       if not (generation.generation_info or {}).get(CACHED_FLAG)]
+        if not generations:
+            return
+        used = 0
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                used += usage.get("total_tokens", 0)
+            else:
+                used += len(generation.text) // 4  # rough estimate when the API reports nothing
+        self.limiter.record_tokens(used)
+        self.limiter.record_success()
+
+    def on_llm_error(self, error, **kwargs):
+        if is_rate_limit_error(error):
+            self.limiter.penalize()
@@ -0,0 +1,266 @@
+import os
+import threading
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+from langchain_chroma import Chroma
+from langchain_core.runnables.config import patch_config
+from termcolor import colored
+
+from config import (
+    get_embeddings, DATA_FOLDER, DB_FOLDER, COLLECTION_MODE, SHARED_COLLECTION,
+    EMBEDDING_MODEL_ID, EMBEDDING_CACHE_DIR, EMBEDDING_CACHE_DTYPE, QUERY_BATCH_WAIT_MS, QUERY_BATCH_MAX,
+    QUERY_EMBEDDING_CACHE_SIZE, SEARCH_WORKERS,
+    RETRIEVAL_MODE, RETRIEVER_K, HYBRID_FETCH_K, RRF_K, VECTOR_STORE, MMAP_DTYPE, MMAP_NPROBE,
+)
+from catalog import Catalog
+from embedding_backends import MicroBatchingEmbeddings
+from embedding_cache import EmbeddingCache, CachedEmbeddings, QueryCachedEmbeddings
+from facts import update_facts
+from indexing import build_or_update_index, load_manifest, index_fingerprint, iter_pages, file_sha256
+from lexical import BM25Index, CombinedLexicalIndex, HybridRetriever, LEXICAL_INDEX_NAME
+from mmap_store import MmapVectorStore, MMAP_INDEX_NAME
+
+
+class RetrieverRegistry(Mapping):
+    """Lazily opened retrievers, one per company in the catalog.
+
+    Nothing is loaded at construction time: the embedding model is created the first
+    time any retriever is needed and each Chroma store is opened (and built/updated if
+    stale) on first lookup. `warm()` opens them up front, optionally in a background
+    thread, so lookups that arrive later find them ready.
+
+    With COLLECTION_MODE="shared" every filing lives in one collection and a company's
+    retriever is that collection plus a {"company": key} filter, so the number of open
+    stores does not grow with the catalog.
+    """
+
+    def __init__(self, files=None, k=RETRIEVER_K, catalog=None):
+        self.catalog = catalog or (Catalog.from_files(files) if files is not None else Catalog.load())
+        self.files = {key: self.catalog.latest(key).file for key in self.catalog.companies}
+        self.k = k
+        self._shared_store = None
+        self._retrievers = {}
+        self._embeddings = None
+        self._embeddings_lock = threading.Lock()
+        self._locks = {key: threading.Lock() for key in self.files}
+        self._fact_locks = {key: threading.Lock() for key in self.files}
+        self._facts_current = set()   # filing ids whose facts were checked in this process
+        self._search_pool = None
+
+    def embeddings(self):
+        if self._embeddings is None:
+            with self._embeddings_lock:
+                if self._embeddings is None:
+                    embeddings = get_embeddings()
+                    if QUERY_BATCH_WAIT_MS > 0:
+                        embeddings = MicroBatchingEmbeddings(embeddings, QUERY_BATCH_MAX, QUERY_BATCH_WAIT_MS)
+                    if EMBEDDING_CACHE_DIR:
+                        cache = EmbeddingCache(EMBEDDING_CACHE_DIR, EMBEDDING_MODEL_ID, EMBEDDING_CACHE_DTYPE)
+                        embeddings = CachedEmbeddings(embeddings, cache)
+                    self._embeddings = QueryCachedEmbeddings(embeddings, QUERY_EMBEDDING_CACHE_SIZE)
+        return self._embeddings
+
+    def _paths(self, key):
+        return os.path.join(DB_FOLDER, key), os.path.join(DATA_FOLDER, self.files[key])
+
+    def _shared_paths(self, filing):
+        shared_dir = os.path.join(DB_FOLDER, SHARED_COLLECTION)
+        return shared_dir, os.path.join(shared_dir, "filings", filing.id), os.path.join(DATA_FOLDER, filing.file)
+
+    def is_available(self, key):
+        """True if `key` can be served, without opening anything."""
+        if key not in self.files:
+            return False
+        if key in self._retrievers:
+            return True
+        if COLLECTION_MODE == "shared":
+            return any(os.path.exists(path) for filing in self.catalog.filings_for(key)
+                       for path in self._shared_paths(filing)[1:])
+        persist_dir, file_path = self._paths(key)
+        return os.path.exists(file_path) or os.path.exists(persist_dir)
+
+    def _index_filing(self, key, file_path, persist_dir, filing, **shared):
+        vectorstore = build_or_update_index(key, file_path, persist_dir, self.embeddings(),
+                                            metadata=filing.metadata(), **shared)
+        self._update_facts(filing, file_path)
+        return vectorstore
+
+    def _update_facts(self, filing, file_path):
+        with self._fact_locks[filing.company]:
+            if filing.id in self._facts_current:
+                return
+            file_hash = file_sha256(file_path)
+            pages = ((doc.metadata["page"], doc.page_content) for doc in iter_pages(file_path, file_hash))
+            update_facts(filing.company, file_path, file_hash, pages, filing.year, filing.form)
+            self._facts_current.add(filing.id)
+
+    def refresh_facts(self, keys=None):
+        """Bring the statement fact index up to date for these companies without opening any store.
+
+        Opening a retriever does this as part of indexing; the fact fast path calls it so a
+        fresh process can answer lookups before anything has been retrieved. `keys=None` means
+        every company, which hashes every filing in the catalog.
+        """
+        for key in self.files if keys is None else keys:
+            for filing in self.catalog.filings_for(key):
+                file_path = os.path.join(DATA_FOLDER, filing.file)
+                if filing.id not in self._facts_current and os.path.exists(file_path):
+                    try:
+                        self._update_facts(filing, file_path)
+                    except Exception as e:
+                        print(colored(f"⚠️ Fact extraction failed for {filing.file}: {e}", "yellow"))
+
+    def shared_store(self):
+        """The single collection holding every filing (COLLECTION_MODE="shared")."""
+        if self._shared_store is None:
+            embeddings = self.embeddings()  # takes _embeddings_lock itself, so not while holding it
+            with self._embeddings_lock:
+                if self._shared_store is None:
+                    self._shared_store = Chroma(collection_name=SHARED_COLLECTION, embedding_function=embeddings,
+                                                persist_directory=os.path.join(DB_FOLDER, SHARED_COLLECTION))
+        return self._shared_store
+
+    def _open_shared(self, key):
+        vectorstore = self.shared_store()
+        indexed, lexical_indexes = 0, []
+        for filing in self.catalog.filings_for(key):
+            shared_dir, manifest_dir, file_path = self._shared_paths(filing)
+            label = f"{key} {filing.form} {filing.year or ''}".strip()
+            if os.path.exists(file_path):
+                self._index_filing(label, file_path, shared_dir, filing, vectorstore=vectorstore,
+                                   manifest_dir=manifest_dir)
+            elif os.path.exists(manifest_dir):
+                print(f"✅ Found existing index for {label} (source PDF missing, skipping freshness check)")
+            else:
+                print(colored(f"❌ Missing file: {filing.file}", "red"))
+                continue
+            indexed += 1
+            if RETRIEVAL_MODE == "hybrid":
+                lexical_indexes.append(self._lexical_index(manifest_dir, vectorstore, where={"filing": filing.id}))
+        if not indexed:
+            return None
+        company_filter = {"company": key}
+        if RETRIEVAL_MODE == "hybrid":
+            lexical_index = lexical_indexes[0] if len(lexical_indexes) == 1 else CombinedLexicalIndex(lexical_indexes, RRF_K)
+            return HybridRetriever(vectorstore=vectorstore, lexical_index=lexical_index, k=self.k,
+                                   fetch_k=HYBRID_FETCH_K, rrf_k=RRF_K, filter=company_filter)
+        return vectorstore.as_retriever(search_kwargs={"k": self.k, "filter": company_filter})
+
+    def _open(self, key):
+        if COLLECTION_MODE == "shared":
+            return self._open_shared(key)
+        persist_dir, file_path = self._paths(key)
+        filing = self.catalog.latest(key)
+        if len(self.catalog.filings_for(key)) > 1:
+            print(f"   {key}: per-company collections index only the latest filing ({filing.year}); "
+                  f"use COLLECTION_MODE=shared for all of them")
+        if os.path.exists(file_path):
+            vectorstore = self._index_filing(key, file_path, persist_dir, filing)
+        elif os.path.exists(persist_dir):
+            print(f"✅ Found existing DB for {key} (source PDF missing, skipping freshness check)")
+            vectorstore = Chroma(persist_directory=persist_dir, embedding_function=self.embeddings())
+        else:
+            print(colored(f"❌ Missing file: {self.files[key]}", "red"))
+            return None
+        if VECTOR_STORE == "mmap":
+            vectorstore = self._mmap_store(persist_dir, vectorstore)
+        if RETRIEVAL_MODE == "hybrid":
+            lexical_index = self._lexical_index(persist_dir, vectorstore)
+            return HybridRetriever(vectorstore=vectorstore, lexical_index=lexical_index,
+                                   k=self.k, fetch_k=HYBRID_FETCH_K, rrf_k=RRF_K)
+        return vectorstore.as_retriever(search_kwargs={"k": self.k})
+
+    def _lexical_index(self, persist_dir, vectorstore, where=None):
+        """Load the BM25 index stored next to the manifest, rebuilding it if the chunks changed."""
+        path = os.path.join(persist_dir, LEXICAL_INDEX_NAME)
+        fingerprint = index_fingerprint(load_manifest(persist_dir))
+        index = BM25Index.load(path)
+        if index is not None and (fingerprint is None or index.fingerprint == fingerprint):
+            return index
+        print(f"🔨 Building lexical index for {os.path.basename(persist_dir)}...")
+        index = BM25Index.from_vectorstore(vectorstore, fingerprint, where=where)
+        index.save(path)
+        return index
+
+    def _mmap_store(self, persist_dir, vectorstore):
+        """Load the quantized copy of the collection, re-exporting it from Chroma if the chunks changed."""
+        path = os.path.join(persist_dir, MMAP_INDEX_NAME)
+        fingerprint = index_fingerprint(load_manifest(persist_dir))
+        store = MmapVectorStore.load(path, self.embeddings(), MMAP_NPROBE)
+        if store is not None and store.dtype == MMAP_DTYPE and (fingerprint is None or store.fingerprint == fingerprint):
+            return store
+        print(f"🔨 Building {MMAP_DTYPE} mmap index for {os.path.basename(persist_dir)}...")
+        return MmapVectorStore.from_vectorstore(vectorstore, path, self.embeddings(), MMAP_DTYPE, fingerprint,
+                                                MMAP_NPROBE)
+
+    def __getitem__(self, key):
+        if key not in self.files:
+            raise KeyError(key)
+        retriever = self._retrievers.get(key)
+        if retriever is None:
+            with self._locks[key]:
+                retriever = self._retrievers.get(key)
+                if retriever is None:
+                    retriever = self._open(key)
+                    if retriever is None:
+                        raise KeyError(key)
+                    self._retrievers[key] = retriever
+        return retriever
+
+    def __contains__(self, key):
+        return self.is_available(key)
+
+    def __iter__(self):
+        return (key for key in self.files if self.is_available(key))
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def warm(self, keys=None, background=False):
+        """Open the given (default: all available) retrievers now.
+
+        With background=True the work runs in a daemon thread, which is returned so
+        callers can join() it; otherwise the opened retrievers are returned as a dict.
+        """
+        keys = [key for key in (keys or self.files) if self.is_available(key)]
+
+        def _open_one(key):
+            try:
+                self[key]
+            except Exception as e:
+                print(colored(f"❌ Failed to open retriever for {key}: {e}", "red"))
+
+        def _warm():
+            # Collections build concurrently; PDF parsing fans out to the shared ingest pool
+            self.embeddings()
+            with ThreadPoolExecutor(max_workers=max(1, min(len(keys), 4))) as executor:
+                list(executor.map(_open_one, keys))
+
+        if background:
+            thread = threading.Thread(target=_warm, name="retriever-warmup", daemon=True)
+            thread.start()
+            return thread
+        _warm()
+        return {key: self._retrievers[key] for key in keys if key in self._retrievers}
+
+    def search(self, question, keys, config=None):
+        """Search several companies for one question and return {key: docs} in `keys` order.
+
+        The question is embedded once up front (later lookups hit the query LRU) and
+        the per-company searches run concurrently on a shared thread pool.
+        """
+        keys = [key for key in keys if self.is_available(key)]
+        if not keys:
+            return {}
+        self.embeddings().embed_query(question)
+        def _search(key):
+            return self[key].invoke(question, patch_config(config, run_name=f"{key}_retriever"))
+
+        if len(keys) == 1:
+            return {keys[0]: _search(keys[0])}
+        if self._search_pool is None:
+            with self._embeddings_lock:
+                if self._search_pool is None:
+                    self._search_pool = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix="retriever-search")
+        futures = {key: self._search_pool.submit(_search, key) for key in keys}
+        return {key: future.result() for key, future in futures.items()}
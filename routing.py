@@ -0,0 +1,68 @@
+import re
+import threading
+from typing import Dict, List, NamedTuple
+import numpy as np
+
+from catalog import AliasMatcher
+
+
+# Words that ask about every company at once ("compare Apple and ...", "all companies")
+ALL_COMPANIES_PATTERN = re.compile(r"\b(both|all (?:the )?companies|each company|every company)\b", re.IGNORECASE)
+
+
+class Route(NamedTuple):
+    targets: List[str]          # companies to search, in config order (may be empty)
+    scores: Dict[str, float]    # confidence per company, 0..1
+    method: str                 # "keyword", "all", "embedding" or "none"
+
+
+class LocalRouter:
+    """Routes a question to company collections without an LLM call.
+
+    Company keys and their aliases (tickers, products, executives) are matched with
+    one compiled regex; a hit is routed with confidence 1.0. Otherwise the question
+    embedding (usually already in the query LRU from retrieval) is compared with one
+    profile embedding per company, and every company within `margin` of the best
+    match is searched if the best clears `min_similarity`. Profiles are embedded
+    once, so a route costs one regex scan plus one small matrix-vector product.
+    """
+
+    def __init__(self, companies, embeddings_factory, aliases=None, profiles=None, min_similarity=0.3, margin=0.05):
+        self.companies = list(companies)
+        self.embeddings_factory = embeddings_factory
+        self.min_similarity = min_similarity
+        self.margin = margin
+        profiles = profiles or {}
+        self.profiles = [profiles.get(c) or f"{c.capitalize()} annual report (Form 10-K)" for c in self.companies]
+        self.matcher = AliasMatcher(self.companies, aliases)
+        self._profile_matrix = None
+        self._lock = threading.Lock()
+
+    def _profiles(self):
+        if self._profile_matrix is None:
+            with self._lock:
+                if self._profile_matrix is None:
+                    matrix = np.asarray(self.embeddings_factory().embed_documents(self.profiles), dtype=np.float32)
+                    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+                    self._profile_matrix = matrix / np.where(norms == 0, 1.0, norms)
+        return self._profile_matrix
+
+    def similarities(self, question):
+        query = np.asarray(self.embeddings_factory().embed_query(question), dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+        return dict(zip(self.companies, (self._profiles() @ query).tolist()))
+
+    def route(self, question):
+        targets = self.matcher.mentioned(question)
+        if targets:
+            return Route(targets, {c: 1.0 if c in targets else 0.0 for c in self.companies}, "keyword")
+        if ALL_COMPANIES_PATTERN.search(question):
+            return Route(list(self.companies), {c: 1.0 for c in self.companies}, "all")
+
+        similarities = self.similarities(question)
+        scores = {c: max(0.0, s) for c, s in similarities.items()}
+        best = max(similarities.values(), default=0.0)
+        if best < self.min_similarity:
+            return Route([], scores, "none")
+        targets = [c for c in self.companies if similarities[c] >= best - self.margin]
+        return Route(targets, scores, "embedding")
@@ -0,0 +1,218 @@
+import os
+# Many questions are embedded at once here, so concurrent query embeddings share model calls
+os.environ.setdefault("QUERY_BATCH_WAIT_MS", "2")
+
+import argparse
+import asyncio
+import json
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from termcolor import colored
+
+from config import (get_rate_limiter, SERVICE_HOST, SERVICE_PORT, SERVICE_MAX_CONCURRENCY, SERVICE_MAX_QUEUE,
+                    SERVICE_QUEUE_TIMEOUT_S)
+from instrumentation import percentile
+from langgraph_agent import get_graph, run_graph_agent, run_legacy_agent, warm
+
+AGENTS = {"graph": run_graph_agent, "legacy": run_legacy_agent}
+MAX_BODY_BYTES = 64 * 1024
+
+
+class Overloaded(Exception):
+    """The question was not admitted (queue full or queued for too long); answered with 503."""
+
+
+class QueryService:
+    """Answers questions on one warm process, in front of the shared LLM quota.
+
+    - Coalescing: a question that is already being answered (same agent, same text up to
+      case and whitespace) waits for that run instead of starting another one.
+    - Admission control: at most `max_concurrency` questions run at once (each on a worker
+      thread); up to `max_queue` more wait, for at most `queue_timeout` seconds. Anything
+      beyond that is rejected right away, so overload shows up as fast 503s instead of
+      an ever-growing backlog of rate-limited LLM calls.
+    """
+
+    def __init__(self, max_concurrency=SERVICE_MAX_CONCURRENCY, max_queue=SERVICE_MAX_QUEUE,
+                 queue_timeout=SERVICE_QUEUE_TIMEOUT_S):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="agent")
+        self._in_flight = {}    # (agent, normalized question) -> future shared by every caller
+        self.admitted = 0       # runs started and not finished yet (running + waiting for a slot)
+        self.waiting = 0
+        self.running = 0
+        self.ready = False
+        self.started = time.time()
+        self.counters = {"requests": 0, "answered": 0, "coalesced": 0, "rejected": 0, "timeouts": 0, "errors": 0}
+        self.latencies = deque(maxlen=1000)
+        self.queue_waits = deque(maxlen=1000)
+
+    @staticmethod
+    def key(agent, question):
+        return agent, " ".join(question.split()).casefold()
+
+    async def ask(self, question, agent="graph"):
+        self.counters["requests"] += 1
+        started = time.perf_counter()
+        key = self.key(agent, question)
+        future = self._in_flight.get(key)
+        coalesced = future is not None
+        if coalesced:
+            self.counters["coalesced"] += 1
+        else:
+            # Admission is decided here, before anything awaits: a burst of simultaneous requests
+            # must see each other's reservations, not a semaphore none of them has reached yet
+            if self.admitted >= self.max_concurrency + self.max_queue:
+                self.counters["rejected"] += 1
+                raise Overloaded(f"queue is full ({self.admitted} admitted)")
+            self.admitted += 1
+            future = asyncio.ensure_future(self._answer(agent, question))
+            self._in_flight[key] = future
+            future.add_done_callback(lambda _: self._release(key))
+        # shield: a caller that disconnects must not cancel the run other callers are waiting on
+        answer = await asyncio.shield(future)
+        elapsed = time.perf_counter() - started
+        self.counters["answered"] += 1
+        self.latencies.append(elapsed)
+        return {"answer": answer, "agent": agent, "coalesced": coalesced, "elapsed_s": elapsed}
+
+    def _release(self, key):
+        self._in_flight.pop(key, None)
+        self.admitted -= 1
+
+    async def _answer(self, agent, question):
+        self.waiting += 1
+        queued = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.counters["timeouts"] += 1
+            raise Overloaded(f"waited {self.queue_timeout:.0f}s in the queue")
+        finally:
+            self.waiting -= 1
+        self.queue_waits.append(time.perf_counter() - queued)
+        self.running += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, AGENTS[agent], question)
+        except Exception:
+            self.counters["errors"] += 1
+            raise
+        finally:
+            self.running -= 1
+            self._slots.release()
+
+    def health(self):
+        return {"status": "ok" if self.ready else "warming", "running": self.running, "queued": self.waiting}
+
+    def metrics(self):
+        latencies, waits = list(self.latencies), list(self.queue_waits)
+        return {
+            **self.counters,
+            "in_flight": len(self._in_flight),
+            "admitted": self.admitted,
+            "running": self.running,
+            "queued": self.waiting,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "latency_p50_s": percentile(latencies, 50),
+            "latency_p95_s": percentile(latencies, 95),
+            "latency_p99_s": percentile(latencies, 99),
+            "queue_wait_p95_s": percentile(waits, 95),
+            "uptime_s": time.time() - self.started,
+            "rate_limiter": get_rate_limiter().stats(),
+        }
+
+    async def route(self, method, path, body):
+        """Return (status, payload, extra headers) for one request."""
+        if method == "GET" and path == "/health":
+            return (200 if self.ready else 503), self.health(), {}
+        if method == "GET" and path == "/metrics":
+            return 200, self.metrics(), {}
+        if path != "/ask":
+            return 404, {"error": f"unknown endpoint {path}"}, {}
+        if method != "POST":
+            return 405, {"error": "use POST"}, {"Allow": "POST"}
+
+        try:
+            request = json.loads(body or b"{}")
+            question = str(request["question"]).strip()
+        except (ValueError, KeyError, TypeError):
+            return 400, {"error": 'expected JSON {"question": ..., "agent": "graph"|"legacy"}'}, {}
+        agent = request.get("agent", "graph")
+        if not question or agent not in AGENTS:
+            return 400, {"error": f"need a question and an agent in {sorted(AGENTS)}"}, {}
+        try:
+            return 200, await self.ask(question, agent), {}
+        except Overloaded as e:
+            return 503, {"error": f"overloaded: {e}"}, {"Retry-After": "1"}
+        except Exception as e:
+            return 500, {"error": f"{type(e).__name__}: {e}"}, {}
+
+    async def handle(self, reader, writer):
+        """Minimal HTTP/1.1: one JSON request per connection."""
+        try:
+            try:
+                method, target, _ = (await reader.readline()).decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length") or 0)
+                if length > MAX_BODY_BYTES:
+                    raise ValueError("request body too large")
+                body = await reader.readexactly(length)
+            except (ValueError, asyncio.IncompleteReadError) as e:
+                status, payload, extra = 400, {"error": f"bad request: {e}"}, {}
+            else:
+                status, payload, extra = await self.route(method.upper(), target.split("?", 1)[0], body)
+
+            data = json.dumps(payload).encode("utf-8")
+            head = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}", "Content-Type: application/json",
+                    f"Content-Length: {len(data)}", "Connection: close"]
+            head += [f"{name}: {value}" for name, value in extra.items()]
+            writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + data)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def warm(self):
+        """Open the retrievers and compile the graph before the first question."""
+        warm()
+        get_graph()
+
+
+async def serve(host=SERVICE_HOST, port=SERVICE_PORT, **limits):
+    service = QueryService(**limits)
+    server = await asyncio.start_server(service.handle, host, port)
+    print(colored(f"🌐 Serving on http://{host}:{port} (POST /ask, GET /health, GET /metrics)", "cyan"))
+    # Requests are accepted while warming (/health says "warming"); early ones simply wait for the indexes
+    await asyncio.get_running_loop().run_in_executor(None, service.warm)
+    service.ready = True
+    print(colored(f"✅ Warm: {service.max_concurrency} concurrent questions, queue of {service.max_queue}", "green"))
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HTTP query service around the graph and legacy agents.")
+    parser.add_argument("--host", default=SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    parser.add_argument("--max-concurrency", type=int, default=SERVICE_MAX_CONCURRENCY)
+    parser.add_argument("--max-queue", type=int, default=SERVICE_MAX_QUEUE)
+    parser.add_argument("--queue-timeout", type=float, default=SERVICE_QUEUE_TIMEOUT_S)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, max_concurrency=args.max_concurrency, max_queue=args.max_queue,
+                          queue_timeout=args.queue_timeout))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,41 @@
+import json
+
+from catalog import AliasMatcher, Catalog, Filing
+
+
+def _catalog(tmp_path):
+    path = tmp_path / "catalog.json"
+    path.write_text(json.dumps({
+        "companies": {"Tesla": {"name": "Tesla, Inc.", "aliases": ["TSLA"], "profile": "Electric cars"}},
+        "filings": [
+            {"company": "tesla", "form": "10-K", "year": 2024, "file": "tsla-2024.pdf"},
+            {"company": "tesla", "form": "10-K", "year": 2023, "file": "tsla-2023.pdf"},
+            {"company": "apple", "file": "aapl.pdf"},
+        ],
+    }))
+    return Catalog.load(str(path))
+
+
+def test_catalog_file_lists_filings_and_company_info(tmp_path):
+    catalog = _catalog(tmp_path)
+    assert catalog.companies == ["tesla", "apple"]
+    assert [f.year for f in catalog.filings_for("tesla")] == [2023, 2024]
+    assert catalog.latest("tesla").file == "tsla-2024.pdf"
+    assert catalog.name("tesla") == "Tesla, Inc."
+    assert catalog.name("apple") == "Apple"
+    assert catalog.aliases() == {"tesla": ["TSLA"], "apple": []}
+    assert catalog.profiles() == {"tesla": "Electric cars"}
+
+
+def test_filing_metadata_omits_unknown_year():
+    assert Filing("tesla", "t.pdf", year=2024).metadata() == {
+        "company": "tesla", "form": "10-K", "filing": "tesla-10-k-2024", "year": 2024}
+    assert Filing("apple", "a.pdf").metadata() == {"company": "apple", "form": "10-K", "filing": "apple-10-k-na"}
+
+
+def test_alias_matcher_reports_the_alias_as_written():
+    matcher = AliasMatcher(["apple", "tesla"], {"tesla": ["TSLA", "Elon Musk"]})
+    assert matcher.matches("Did elon musk's TSLA beat Apple?") == [
+        ("tesla", "elon musk"), ("tesla", "TSLA"), ("apple", "Apple")]
+    assert matcher.mentioned("Did TSLA beat Apple?") == ["apple", "tesla"]
+    assert matcher.mentioned("Pineapple sold in Teslaville") == []
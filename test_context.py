@@ -0,0 +1,59 @@
+from langchain_core.documents import Document
+
+from context import estimate_tokens, merge_passages, pack_context
+
+
+def _doc(text, page, start, source="a.pdf"):
+    return Document(page_content=text, metadata={"page": page, "start_index": start, "source": source})
+
+
+def _page_chunks(source, page, count, size=800, overlap=200, letter="x"):
+    """Overlapping chunks of one page, as the splitter produces them."""
+    text = "".join(f"{letter}{i:04d} " for i in range(count * size // 6 + 10))
+    step = size - overlap
+    return [_doc(text[i * step:i * step + size], page, i * step, source) for i in range(count)], text
+
+
+def test_overlapping_chunks_are_stitched_without_repeating_text():
+    docs, text = _page_chunks("a.pdf", 3, 3)
+    [passage] = merge_passages("apple", docs)
+    assert passage.text == text[:passage.end - passage.start]
+    assert passage.start == 0 and passage.page == 3
+
+
+def test_duplicate_text_from_another_page_is_dropped():
+    docs = [_doc("Total net sales 391,035", 10, 0), _doc("Total net sales 391,035", 40, 0)]
+    assert len(merge_passages("apple", docs)) == 1
+
+
+def test_every_company_keeps_a_share_of_the_budget():
+    apple, _ = _page_chunks("aapl.pdf", 5, 6, letter="a")   # one region hit by many chunks: a high merged score
+    tesla = [_doc("Tesla research and development expenses were $4,540 million. " * 20, 50, 0, "tsla.pdf")]
+    context, stats = pack_context({"apple": apple, "tesla": tesla}, budget=800, min_tokens=100)
+
+    assert "[Source: Apple 10-K, page 6]" in context
+    assert "[Source: Tesla 10-K, page 51]" in context
+    assert context.index("Apple") < context.index("Tesla")
+    assert stats["packed"] == 2 and stats["tokens"] <= 800 + 10
+
+
+def test_a_small_company_leaves_its_unused_share_to_the_others():
+    apple, _ = _page_chunks("aapl.pdf", 5, 6, letter="a")
+    tesla = [_doc("Tesla total revenues were $97,690 million.", 50, 0, "tsla.pdf")]
+    context, _ = pack_context({"apple": apple, "tesla": tesla}, budget=800, min_tokens=100)
+    apple_part = context.split("[Source: Tesla")[0]
+    assert estimate_tokens(apple_part) > 700
+
+
+def test_single_company_fills_the_budget_by_score():
+    docs = [_doc(f"passage {i} " + "word " * 150, i, 0) for i in range(6)]
+    context, stats = pack_context({"apple": docs}, budget=600, min_tokens=100)
+    assert "passage 0" in context and "passage 1" in context
+    assert "passage 5" not in context
+    assert stats["tokens"] <= 600 + 10
+
+
+def test_no_budget_keeps_everything():
+    docs = [_doc(f"passage {i} " + "word " * 150, i, 0) for i in range(6)]
+    _, stats = pack_context({"apple": docs}, budget=None)
+    assert stats["packed"] == 6
@@ -0,0 +1,115 @@
+import multiprocessing
+import os
+
+import numpy as np
+import pytest
+
+from embedding_cache import CachedEmbeddings, EmbeddingCache
+
+MODEL = "test/model"
+
+
+def _vector(key, dim=4):
+    return [float(ord(key[0])), float(len(key)), 1.0, 2.0][:dim]
+
+
+def test_vectors_survive_a_reopen(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), MODEL, "float32")
+    cache.put_many(["a", "b"], [_vector("a"), _vector("b")])
+    reopened = EmbeddingCache(str(tmp_path), MODEL, "float32")
+    assert len(reopened) == 2
+    assert reopened.get_many(["b", "a", "zz"]) == [_vector("b"), _vector("a"), None]
+
+
+def test_duplicate_keys_are_stored_once(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), MODEL, "float32")
+    cache.put_many(["a", "a", "b"], [_vector("a")] * 2 + [_vector("b")])
+    cache.put_many(["b"], [_vector("b")])
+    assert len(EmbeddingCache(str(tmp_path), MODEL, "float32")) == 2
+
+
+def test_other_model_or_dtype_starts_over(tmp_path):
+    EmbeddingCache(str(tmp_path), MODEL, "float32").put_many(["a"], [_vector("a")])
+    assert len(EmbeddingCache(str(tmp_path), MODEL, "float16")) == 0
+    assert len(EmbeddingCache(str(tmp_path), "other/model", "float32")) == 0
+
+
+@pytest.mark.parametrize("torn_bytes", [3, 16 + 5])
+def test_torn_vector_append_is_cut_off(tmp_path, torn_bytes):
+    cache = EmbeddingCache(str(tmp_path), MODEL, "float32")
+    cache.put_many(["a", "b"], [_vector("a"), _vector("b")])
+    with open(os.path.join(cache.path, "vectors.bin"), "ab") as f:
+        f.write(b"\x09" * torn_bytes)   # crash after part of the next append's vectors
+
+    reopened = EmbeddingCache(str(tmp_path), MODEL, "float32")
+    reopened.put_many(["c"], [_vector("c")])
+    final = EmbeddingCache(str(tmp_path), MODEL, "float32")
+    assert final.get_many(["a", "b", "c"]) == [_vector("a"), _vector("b"), _vector("c")]
+
+
+def test_torn_key_line_is_cut_off(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), MODEL, "float32")
+    cache.put_many(["a"], [_vector("a")])
+    with open(os.path.join(cache.path, "vectors.bin"), "ab") as f:
+        f.write(np.asarray(_vector("b"), dtype=np.float32).tobytes())
+    with open(os.path.join(cache.path, "keys.txt"), "ab") as f:
+        f.write(b"b-partial")
+
+    reopened = EmbeddingCache(str(tmp_path), MODEL, "float32")
+    assert reopened.get_many(["a", "b-partial"]) == [_vector("a"), None]
+    reopened.put_many(["c"], [_vector("c")])
+    assert EmbeddingCache(str(tmp_path), MODEL, "float32").get_many(["c"]) == [_vector("c")]
+
+
+def test_two_writers_never_share_rows(tmp_path):
+    first = EmbeddingCache(str(tmp_path), MODEL, "float32")
+    second = EmbeddingCache(str(tmp_path), MODEL, "float32")
+    first.put_many(["k1"], [_vector("k1")])
+    second.put_many(["k2", "k1"], [_vector("k2"), _vector("k1")])
+    first.put_many(["k3"], [[9.0, 9.0, 9.0, 9.0]])
+
+    reopened = EmbeddingCache(str(tmp_path), MODEL, "float32")
+    assert len(reopened) == 3
+    assert reopened.get_many(["k1", "k2", "k3"]) == [_vector("k1"), _vector("k2"), [9.0] * 4]
+    assert second.get_many(["k1"]) == [_vector("k1")]
+    assert first.get_many(["k1", "k2"]) == [_vector("k1"), _vector("k2")]
+
+
+def _write_keys(cache_dir, prefix, count):
+    cache = EmbeddingCache(cache_dir, MODEL, "float32")
+    for i in range(count):
+        key = f"{prefix}{i}"
+        cache.put_many([key], [[float(i), float(ord(prefix)), 0.0, 1.0]])
+
+
+def test_concurrent_processes_keep_rows_aligned(tmp_path):
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=_write_keys, args=(str(tmp_path), prefix, 40)) for prefix in "xyz"]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(60)
+        assert worker.exitcode == 0
+
+    cache = EmbeddingCache(str(tmp_path), MODEL, "float32")
+    assert len(cache) == 120
+    for prefix in "xyz":
+        keys = [f"{prefix}{i}" for i in range(40)]
+        assert cache.get_many(keys) == [[float(i), float(ord(prefix)), 0.0, 1.0] for i in range(40)]
+
+
+class _CountingEmbeddings:
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(t)), 0.0, 0.0, 1.0] for t in texts]
+
+
+def test_cached_embeddings_only_embed_misses(tmp_path):
+    model = _CountingEmbeddings()
+    embeddings = CachedEmbeddings(model, EmbeddingCache(str(tmp_path), MODEL, "float32"))
+    embeddings.embed_documents(["one", "three"])
+    assert embeddings.embed_documents(["three", "seven!"]) == [[5.0, 0, 0, 1], [6.0, 0, 0, 1]]
+    assert model.calls == [["one", "three"], ["seven!"]]
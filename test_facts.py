@@ -0,0 +1,137 @@
+import pytest
+
+import facts
+from facts import FactStore, extract_statement_facts, lookup_fact, update_facts
+
+OPERATIONS_2024 = """TESLA, INC.
+CONSOLIDATED STATEMENTS OF OPERATIONS
+(in millions, except per share data)
+Year Ended December 31,
+2024
+2023
+Revenues
+Automotive sales
+$
+72,480
+$
+78,509
+Energy generation and storage
+10,086
+6,035
+Total revenues
+97,690
+96,773
+Operating expenses
+Research and development
+4,540
+3,969
+Selling, general and administrative
+5,150
+4,800
+Total operating expenses
+9,690
+8,769
+Net income
+$
+7,153
+$
+14,997
+"""
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = FactStore(str(tmp_path / "facts.sqlite3"))
+    monkeypatch.setattr(facts, "FACT_STORE", store)
+    update_facts("tesla", "tsla-2024.pdf", "hash-2024", [(51, OPERATIONS_2024)], filing_year=2024)
+    return store
+
+
+def test_extracts_one_fact_per_line_item_and_year():
+    rows = extract_statement_facts(OPERATIONS_2024, 51)
+    by_key = {(r["section"], r["line_item"], r["fiscal_year"]): r["value"] for r in rows}
+    assert by_key[("Revenues", "Total revenues", 2024)] == 97690
+    assert by_key[("Operating expenses", "Research and development", 2023)] == 3969
+    assert by_key[("", "Net income", 2024)] == 7153
+    assert {r["unit"] for r in rows} == {"millions"}
+
+
+@pytest.mark.parametrize("question,value", [
+    ("What were Tesla's total revenues in 2024?", 97690),
+    ("What is the specific revenue figure for 'Automotive sales' for Tesla in 2024?", 72480),
+    ("Tesla 2024 年的研發費用 (R&D expenses) 是多少？", 4540),
+    ("What was Tesla's net income in 2023?", 14997),
+    ("According to the Consolidated Statements of Operations, what was Tesla's SG&A in 2024?", 5150),
+])
+def test_direct_lookups_are_answered(store, question, value):
+    answer, fact = lookup_fact(question, ["apple", "tesla"])
+    assert fact["value"] == value
+    assert f"{value:,}" in answer
+
+
+@pytest.mark.parametrize("question", [
+    "What did Tesla say about risks to revenue in 2024?",
+    "What were Tesla's revenues from China in 2024?",
+    "How did Tesla's total revenues change from 2023 to 2024?",
+    "Compare the R&D expenses of Apple and Tesla in 2024.",
+    "What were the total revenues in 2024?",
+    "Who signed the 10-K report as the Chief Executive Officer for Tesla?",
+])
+def test_questions_that_are_not_a_single_line_item_fall_through(store, question):
+    assert lookup_fact(question, ["apple", "tesla"]) is None
+
+
+def test_unchanged_filing_is_not_re_extracted(store):
+    update_facts("tesla", "tsla-2024.pdf", "hash-2024", iter(()), filing_year=2024)
+    assert lookup_fact("What were Tesla's total revenues in 2024?", ["tesla"]) is not None
+
+
+def test_newest_filing_wins_for_restated_figures(store):
+    restated = OPERATIONS_2024.replace("2024\n2023", "2025\n2024").replace("97,690\n96,773", "101,000\n99,000")
+    update_facts("tesla", "tsla-2025.pdf", "hash-2025", [(50, restated)], filing_year=2025)
+    answer, fact = lookup_fact("What were Tesla's total revenues in 2024?", ["tesla"])
+    assert fact["value"] == 99000 and fact["source"] == "tsla-2025.pdf"
+
+
+ALIASES = {"apple": ["aapl", "iphone"], "tesla": ["tsla", "tesla inc", "cybertruck"]}
+
+
+@pytest.mark.parametrize("question", [
+    "What were TSLA's total revenues in 2024?",
+    "What were Tesla Inc's total revenues in 2024?",
+])
+def test_company_is_found_through_catalog_aliases(store, question):
+    answer, fact = lookup_fact(question, ["apple", "tesla"], ALIASES)
+    assert fact["value"] == 97690
+
+
+def test_product_aliases_still_have_to_match_the_row(store):
+    assert lookup_fact("What were Cybertruck revenues in 2024?", ["apple", "tesla"], ALIASES) is None
+
+
+def test_alias_is_matched_on_word_boundaries(store):
+    assert lookup_fact("What were the total revenues of Teslanet in 2024?", ["apple", "tesla"]) is None
+
+
+def test_answer_cites_the_form_and_year_of_the_source_filing(store):
+    update_facts("tesla", "tsla-q1.pdf", "hash-q1", [(5, OPERATIONS_2024.replace("2024\n2023", "2026\n2025"))],
+                 filing_year=2026, form="10-Q")
+    answer, _ = lookup_fact("What were Tesla's total revenues in 2026?", ["tesla"])
+    assert "[Source: Tesla 10-Q 2026, CONSOLIDATED STATEMENTS OF OPERATIONS, page 6]" in answer
+    answer, _ = lookup_fact("What were Tesla's total revenues in 2023?", ["tesla"])
+    assert "[Source: Tesla 10-K 2024," in answer
+
+
+def test_tables_without_a_form_column_are_rebuilt(tmp_path):
+    import sqlite3
+    path = str(tmp_path / "old.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute("""CREATE TABLE facts (company TEXT, fiscal_year INTEGER, statement TEXT, section TEXT,
+                    line_item TEXT, unit TEXT, value REAL, page INTEGER, source TEXT,
+                    PRIMARY KEY (company, fiscal_year, statement, section, line_item, unit, source))""")
+    conn.execute("CREATE TABLE filings (company TEXT, source TEXT, file_hash TEXT, filing_year INTEGER, "
+                 "PRIMARY KEY (company, source))")
+    conn.execute("INSERT INTO filings VALUES ('tesla', 'tsla-2024.pdf', 'hash-2024', 2024)")
+    conn.commit()
+    conn.close()
+    assert not FactStore(path).is_current("tesla", "tsla-2024.pdf", "hash-2024")
@@ -0,0 +1,60 @@
+import zlib
+
+import numpy as np
+import pytest
+
+from grading import LocalGrader
+
+
+class _BagOfWords:
+    """Hashed word counts: texts sharing words are similar, unrelated texts are orthogonal-ish."""
+
+    def __init__(self):
+        self.documents = 0
+
+    def _embed(self, text):
+        vector = np.zeros(256)
+        for word in text.lower().split():
+            vector[zlib.crc32(word.strip(".,?$").encode()) % 256] += 1
+        return vector.tolist()
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+    def embed_documents(self, texts):
+        self.documents += len(texts)
+        return [self._embed(t) for t in texts]
+
+
+QUESTION = "What were Tesla total revenues in 2024?"
+RELEVANT = "[Source: Tesla 10-K FY2024, page 52]\nTesla total revenues in 2024 were 97,690 million."
+UNRELATED = "[Source: Apple 10-K FY2024, page 3]\nThe board met four times and approved the charter."
+
+
+@pytest.fixture
+def model():
+    return _BagOfWords()
+
+
+def test_clear_cases_are_decided_locally(model):
+    grader = LocalGrader(lambda: model)
+    assert grader.grade(QUESTION, RELEVANT)[0] == "yes"
+    assert grader.grade(QUESTION, UNRELATED)[0] == "no"
+
+
+def test_source_tags_alone_are_not_evidence(model):
+    grade, scores = LocalGrader(lambda: model).grade(QUESTION, "[Source: Tesla 10-K FY2024, page 52]")
+    assert grade == "no" and scores["score"] == 0.0
+
+
+def test_uncertain_band_is_left_to_the_llm_unless_forced(model):
+    grader = LocalGrader(lambda: model, yes_threshold=0.99, no_threshold=0.01)
+    grade, scores = grader.grade(QUESTION, RELEVANT)
+    assert grade is None and 0.01 <= scores["score"] < 0.99
+    assert grader.grade(QUESTION, RELEVANT, decide=True)[0] in ("yes", "no")
+
+
+def test_windows_are_embedded_with_the_window_model(model):
+    windows_model = _BagOfWords()
+    LocalGrader(lambda: model, window_embeddings_factory=lambda: windows_model).score(QUESTION, RELEVANT * 30)
+    assert model.documents == 0 and windows_model.documents > 1
@@ -0,0 +1,115 @@
+import threading
+
+import pytest
+
+import indexing
+
+
+@pytest.fixture
+def pdf(tmp_path):
+    import fitz
+
+    path = tmp_path / "filing.pdf"
+    with fitz.open() as doc:
+        for number in range(5):
+            doc.new_page().insert_text((72, 72), f"Page {number} of the filing")
+        doc.save(str(path))
+    return str(path)
+
+
+@pytest.fixture
+def no_page_cache(monkeypatch):
+    monkeypatch.setattr(indexing, "PAGE_CACHE_PATH", "")
+    monkeypatch.setattr(indexing, "_page_cache", None)
+
+
+def test_ingest_pool_does_not_fork_a_threaded_parent(pdf, no_page_cache, monkeypatch):
+    monkeypatch.setattr(indexing, "INGEST_WORKERS", 2)
+    monkeypatch.setattr(indexing, "PAGES_PER_TASK", 2)
+    monkeypatch.setattr(indexing, "_pool", None)
+    # The pool is normally created from a warm-up thread while other threads are running
+    pools = []
+    thread = threading.Thread(target=lambda: pools.append(indexing.get_ingest_pool()))
+    thread.start()
+    thread.join()
+    pool = pools[0]
+    try:
+        assert pool._mp_context.get_start_method() != "fork"
+        pages = list(indexing.iter_pages(pdf))
+    finally:
+        pool.shutdown()
+    assert [page.metadata["page"] for page in pages] == [0, 1, 2, 3, 4]
+    assert all(f"Page {i} of the filing" in page.page_content for i, page in enumerate(pages))
+    assert {page.metadata["total_pages"] for page in pages} == {5}
+
+
+class _CountingEmbeddings:
+    def __init__(self):
+        from langchain_core.embeddings import DeterministicFakeEmbedding
+        self.model = DeterministicFakeEmbedding(size=16)
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return self.model.embed_documents(texts)
+
+    def embed_query(self, text):
+        return self.model.embed_query(text)
+
+
+def _write_pdf(path, pages):
+    import fitz
+
+    with fitz.open() as doc:
+        for text in pages:
+            doc.new_page().insert_text((72, 72), text)
+        doc.save(str(path))
+
+
+@pytest.fixture
+def single_process(no_page_cache, monkeypatch):
+    monkeypatch.setattr(indexing, "INGEST_WORKERS", 1)
+
+
+def test_manifest_skips_unchanged_files_and_reembeds_only_changed_chunks(tmp_path, single_process):
+    pdf, db = tmp_path / "filing.pdf", str(tmp_path / "db")
+    _write_pdf(pdf, [f"Page {i}: revenue line items" for i in range(4)])
+    embeddings = _CountingEmbeddings()
+
+    indexing.build_or_update_index("acme", str(pdf), db, embeddings)
+    assert len(embeddings.embedded) == 4
+    manifest = indexing.load_manifest(db)
+    assert indexing.is_current(manifest, indexing.file_sha256(str(pdf)))
+    assert len(manifest["chunk_ids"]) == 4
+
+    embeddings.embedded.clear()
+    indexing.build_or_update_index("acme", str(pdf), db, embeddings)
+    assert embeddings.embedded == []
+
+    _write_pdf(pdf, [f"Page {i}: revenue line items" for i in range(3)] + ["Page 3: restated"])
+    vectorstore = indexing.build_or_update_index("acme", str(pdf), db, embeddings)
+    assert embeddings.embedded == ["Page 3: restated"]
+    stored = vectorstore.get(include=["metadatas"])
+    assert len(stored["ids"]) == 4
+    assert all(metadata["chunk_id"] == doc_id for doc_id, metadata in zip(stored["ids"], stored["metadatas"]))
+
+
+def test_splitter_or_model_changes_make_the_manifest_stale(tmp_path, monkeypatch):
+    manifest = {"version": indexing.MANIFEST_VERSION, "embedding_model": indexing.EMBEDDING_MODEL_ID,
+                "file_hash": "h", "splitter": indexing.splitter_settings(), "chunk_ids": []}
+    assert indexing.is_current(manifest, "h")
+    assert not indexing.is_current(manifest, "other")
+    monkeypatch.setattr(indexing, "CHUNK_SIZE", indexing.CHUNK_SIZE + 1)
+    assert not indexing.is_current(manifest, "h") and indexing.is_reusable(manifest)
+    assert not indexing.is_reusable({**manifest, "embedding_model": "another-model"})
+
+
+def test_stored_id_falls_back_to_metadata_then_content():
+    from langchain_core.documents import Document
+
+    doc = Document(page_content="text", metadata={"page": 1, "start_index": 0})
+    assert indexing.stored_id(doc) == indexing.chunk_id(doc)
+    doc.metadata["chunk_id"] = "tesla-10-k-2024:abc"
+    assert indexing.stored_id(doc) == "tesla-10-k-2024:abc"
+    doc.id = "explicit"
+    assert indexing.stored_id(doc) == "explicit"
@@ -0,0 +1,87 @@
+import pytest
+
+import langgraph_agent
+
+
+def test_fact_lookup_refreshes_only_the_named_company(monkeypatch):
+    refreshed = []
+    monkeypatch.setattr(langgraph_agent, "FACT_FAST_PATH", True)
+    monkeypatch.setattr(langgraph_agent.RETRIEVERS, "refresh_facts", lambda keys=None: refreshed.append(keys))
+    monkeypatch.setattr(langgraph_agent, "lookup_fact", lambda *args: ("answer", {"statement": "s", "page": 0}))
+
+    assert langgraph_agent.fact_lookup_node({"question": "What were TSLA's total revenues in 2024?"}) == \
+        {"generation": "answer"}
+    assert refreshed == [["tesla"]]
+
+
+def test_fact_lookup_skips_questions_without_exactly_one_company(monkeypatch):
+    refreshed = []
+    monkeypatch.setattr(langgraph_agent, "FACT_FAST_PATH", True)
+    monkeypatch.setattr(langgraph_agent.RETRIEVERS, "refresh_facts", lambda keys=None: refreshed.append(keys))
+
+    assert langgraph_agent.fact_lookup_node({"question": "Compare Apple and Tesla revenues in 2024"}) == {}
+    assert langgraph_agent.fact_lookup_node({"question": "What were total revenues in 2024?"}) == {}
+    assert refreshed == []
+
+
+class _FakeRetriever:
+    def __init__(self, key):
+        self.key = key
+
+    def invoke(self, query):
+        from langchain_core.documents import Document
+        return [Document(page_content=f"{self.key} passage for {query}")]
+
+
+def test_legacy_search_tool_opens_only_the_requested_company(monkeypatch):
+    opened = []
+    registry = langgraph_agent.RETRIEVERS
+    monkeypatch.setattr(type(registry), "is_available", lambda self, key: key in self.files)
+    monkeypatch.setattr(type(registry), "__getitem__", lambda self, key: opened.append(key) or _FakeRetriever(key))
+
+    assert langgraph_agent.search_financials("tesla: total revenues 2024") == "tesla passage for total revenues 2024"
+    assert langgraph_agent.search_financials("TSLA: R&D expenses") == "tesla passage for R&D expenses"
+    assert opened == ["tesla", "tesla"]
+    assert langgraph_agent.search_financials("Acme: revenue").startswith("Unknown company")
+
+
+@pytest.fixture
+def legacy_builds(monkeypatch):
+    monkeypatch.setattr(langgraph_agent, "_LEGACY_AGENT", None)
+    monkeypatch.setattr(langgraph_agent, "_LEGACY_AGENT_ERROR", None)
+    outcomes, builds = [], []
+
+    def build():
+        builds.append(1)
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    monkeypatch.setattr(langgraph_agent, "build_legacy_agent", build)
+    return outcomes, builds
+
+
+def test_legacy_configuration_error_is_not_rebuilt(legacy_builds, monkeypatch):
+    outcomes, builds = legacy_builds
+    outcomes.append(ValueError("Prompt missing required variables"))
+    monkeypatch.setattr(langgraph_agent, "LEGACY_AGENT_RETRY_S", 0.0)
+    for _ in range(3):
+        with pytest.raises(RuntimeError, match="Prompt missing"):
+            langgraph_agent.get_legacy_agent()
+    assert len(builds) == 1
+
+
+def test_legacy_transient_error_is_retried_after_the_backoff(legacy_builds, monkeypatch):
+    outcomes, builds = legacy_builds
+    outcomes.extend([RuntimeError("database is locked"), "agent"])
+    with pytest.raises(RuntimeError, match="database is locked"):
+        langgraph_agent.get_legacy_agent()
+    with pytest.raises(RuntimeError, match="database is locked"):
+        langgraph_agent.get_legacy_agent()   # still inside the backoff
+    assert len(builds) == 1
+
+    monkeypatch.setattr(langgraph_agent, "LEGACY_AGENT_RETRY_S", 0.0)
+    assert langgraph_agent.get_legacy_agent() == "agent"
+    assert langgraph_agent.get_legacy_agent() == "agent"
+    assert len(builds) == 2
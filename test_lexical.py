@@ -0,0 +1,52 @@
+from langchain_core.documents import Document
+
+from lexical import BM25Index, CombinedLexicalIndex, HybridRetriever, reciprocal_rank_fusion, tokenize
+
+
+class _Store:
+    """Just enough of the Chroma API for the lexical index and the hybrid retriever."""
+
+    def __init__(self, texts, prefix):
+        self.docs = [Document(id=f"{prefix}{i}", page_content=text) for i, text in enumerate(texts)]
+
+    def get(self, ids=None, limit=None, offset=0, include=None, where=None):
+        docs = [d for d in self.docs if d.id in ids] if ids is not None else self.docs[offset:offset + limit]
+        return {"ids": [d.id for d in docs], "documents": [d.page_content for d in docs],
+                "metadatas": [d.metadata for d in docs]}
+
+    def similarity_search(self, query, k=4, **kwargs):
+        return self.docs[:k]
+
+
+def _index(texts, prefix):
+    return BM25Index.from_vectorstore(_Store(texts, prefix))
+
+
+def test_numbers_match_with_and_without_separators():
+    assert tokenize("Net sales were $391,035 million") == ["net", "sales", "391,035", "391035", "million"]
+    [(doc_id, _)] = _index(["total 391,035", "other text"], "a").search("391035", k=1)
+    assert doc_id == "a0"
+
+
+def test_combined_index_fuses_filings_by_rank_not_raw_score():
+    # "restated" is rare in the large filing and common in the small one, so the large
+    # filing's raw BM25 scores are higher for every hit
+    large = _index(["restated revenue", "restated revenue figures"] + [f"line item {i}" for i in range(40)], "new")
+    small = _index(["restated revenue", "restated", "revenue restated"], "old")
+    large_hits, small_hits = large.search("restated revenue"), small.search("restated revenue")
+    assert large_hits[1][1] > small_hits[0][1]
+
+    top = [doc_id for doc_id, _ in CombinedLexicalIndex([large, small]).search("restated revenue", k=2)]
+    assert sorted(top) == sorted([large_hits[0][0], small_hits[0][0]])
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    assert reciprocal_rank_fusion([["a", "b", "c"], ["b", "c"]])[0] == "b"
+
+
+def test_hybrid_retriever_fetches_lexical_only_hits():
+    store = _Store(["dense hit", "nothing", "exact phrase 4,540"], "d")
+    lexical = BM25Index.from_vectorstore(store)
+    retriever = HybridRetriever(vectorstore=store, lexical_index=lexical, k=2, fetch_k=1)
+    docs = retriever.invoke("4,540")
+    assert {d.id for d in docs} == {"d0", "d2"}
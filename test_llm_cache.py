@@ -0,0 +1,68 @@
+import json
+
+from langchain_core.outputs import Generation
+
+from llm_cache import DiskLLMCache
+from rate_limit import CACHED_FLAG
+
+
+LLM = "gemini-test temperature=0"
+
+
+class _Words:
+    """Embeds a text by which of a few words it contains."""
+
+    WORDS = ["revenue", "tesla", "apple", "board"]
+
+    def embed_query(self, text):
+        return [float(word in text.lower()) for word in self.WORDS]
+
+
+def _prompt(*contents):
+    return json.dumps([{"kwargs": {"content": c}} for c in contents])
+
+
+def _cache(tmp_path, **kwargs):
+    return DiskLLMCache(str(tmp_path / "llm.sqlite"), **kwargs)
+
+
+def test_exact_hit_is_marked_as_cached(tmp_path):
+    cache = _cache(tmp_path)
+    prompt = _prompt("system", "What was Tesla revenue?")
+    assert cache.lookup(prompt, LLM) is None
+    cache.update(prompt, LLM, [Generation(text="97,690")])
+
+    hit = cache.lookup(prompt, LLM)
+    assert [g.text for g in hit] == ["97,690"]
+    assert hit[0].generation_info[CACHED_FLAG] is True
+    assert cache.lookup(prompt, "another-model") is None
+    assert cache.stats()["hits"] == 1
+
+
+def test_semantic_hit_requires_the_same_prefix(tmp_path):
+    cache = _cache(tmp_path, semantic_threshold=0.9, embeddings_factory=_Words)
+    cache.update(_prompt("context A", "Tesla revenue?"), LLM, [Generation(text="97,690")])
+
+    hit = cache.lookup(_prompt("context A", "What was the revenue of Tesla"), LLM)
+    assert [g.text for g in hit] == ["97,690"]
+    assert cache.semantic_hits == 1
+    # Same last message, different context: never reused
+    assert cache.lookup(_prompt("context B", "What was the revenue of Tesla"), LLM) is None
+    # Same context, dissimilar question
+    assert cache.lookup(_prompt("context A", "What was Apple revenue?"), LLM) is None
+
+
+def test_long_final_message_is_exact_match_only(tmp_path):
+    cache = _cache(tmp_path, semantic_threshold=0.5, embeddings_factory=_Words)
+    long_question = "Tesla revenue " + "x" * DiskLLMCache.SEMANTIC_MAX_CHARS
+    cache.update(_prompt("ctx", long_question), LLM, [Generation(text="cached")])
+    assert cache.lookup(_prompt("ctx", long_question + "?"), LLM) is None
+
+
+def test_entries_beyond_max_are_evicted(tmp_path):
+    cache = _cache(tmp_path, max_entries=2)
+    for i in range(4):
+        cache.update(_prompt(f"question {i}"), LLM, [Generation(text=str(i))])
+    assert cache.stats()["entries"] == 2
+    assert cache.lookup(_prompt("question 0"), LLM) is None
+    assert cache.lookup(_prompt("question 3"), LLM)[0].text == "3"
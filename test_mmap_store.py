@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from mmap_store import MmapVectorStore, ReadOnlyStoreError, matches_filter
+
+DIM = 32
+
+
+@pytest.fixture
+def store(tmp_path):
+    embedding = DeterministicFakeEmbedding(size=DIM)
+    texts = [f"{company} passage {i}" for company in ("apple", "tesla") for i in range(20)]
+    metadatas = [{"company": text.split()[0], "page": i % 20} for i, text in enumerate(texts)]
+    vectors = embedding.embed_documents(texts)
+    ids = [f"id-{i}" for i in range(len(texts))]
+    path = str(tmp_path / "mmap_index")
+    return MmapVectorStore.build(path, ids, vectors, texts, metadatas, embedding, "float16", n_lists=4, nprobe=4)
+
+
+def test_exact_text_is_its_own_nearest_neighbour(store):
+    [doc] = store.similarity_search("tesla passage 7", k=1)
+    assert doc.page_content == "tesla passage 7" and doc.id == "id-27"
+
+
+@pytest.mark.parametrize("dtype", ["int8", "float16"])
+def test_quantized_scores_stay_close_to_cosine(tmp_path, dtype):
+    embedding = DeterministicFakeEmbedding(size=DIM)
+    texts = [f"text {i}" for i in range(30)]
+    vectors = np.asarray(embedding.embed_documents(texts), dtype=np.float32)
+    store = MmapVectorStore.build(str(tmp_path / dtype), [str(i) for i in range(30)], vectors, texts,
+                                  [{} for _ in texts], embedding, dtype, n_lists=2, nprobe=2)
+    [(doc, score)] = store.similarity_search_with_score("text 3", k=1)
+    assert doc.page_content == "text 3" and score == pytest.approx(1.0, abs=0.02)
+
+
+def test_filter_only_returns_matching_documents(store):
+    docs = store.similarity_search("apple passage 3", k=5, filter={"company": "tesla"})
+    assert len(docs) == 5 and {d.metadata["company"] for d in docs} == {"tesla"}
+    docs = store.similarity_search("x", k=50, filter={"$and": [{"company": "apple"}, {"page": {"$in": [1, 2]}}]})
+    assert sorted(d.page_content for d in docs) == ["apple passage 1", "apple passage 2"]
+
+
+def test_unsupported_search_options_are_rejected(store):
+    with pytest.raises(NotImplementedError):
+        store.similarity_search("apple", k=2, where_document={"$contains": "apple"})
+    with pytest.raises(NotImplementedError):
+        store.similarity_search("apple", k=2, filter={"page": {"$gt": 3}})
+
+
+def test_get_with_where_and_ids(store):
+    assert len(store.get(where={"company": "apple"})["ids"]) == 20
+    assert store.get(ids=["id-0", "id-25"], where={"company": "tesla"})["ids"] == ["id-25"]
+    assert len(store.get(limit=3, offset=38)["ids"]) == 2   # rows are stored grouped by IVF list
+
+
+def test_store_is_read_only_and_reopens(store):
+    with pytest.raises(ReadOnlyStoreError):
+        store.add_texts(["new"])
+    with pytest.raises(ReadOnlyStoreError):
+        store.delete(["id-0"])
+    reopened = MmapVectorStore.load(store.path, store.embedding, nprobe=4)
+    assert len(reopened) == 40
+
+
+def test_matches_filter_operators():
+    metadata = {"company": "apple", "year": 2024}
+    assert matches_filter(metadata, {"year": {"$ne": 2023}, "company": {"$nin": ["tesla"]}})
+    assert matches_filter(metadata, {"$or": [{"company": "tesla"}, {"year": 2024}]})
+    assert not matches_filter(metadata, {"company": "apple", "year": 2023})
@@ -0,0 +1,30 @@
+from page_cache import PageCache
+
+
+def _record(page, total=2):
+    return page, f"page {page} text", total, [[0.0, 0.0, 10.0, 10.0, f"page {page} text"]], []
+
+
+def test_pages_are_served_only_once_the_file_is_complete(tmp_path):
+    cache = PageCache(str(tmp_path / "pages.sqlite"))
+    cache.put_pages("abc", [_record(1)])
+    assert not cache.is_complete("abc")  # interrupted parse: redone from the PDF
+
+    cache.put_pages("abc", [_record(0)])
+    cache.mark_complete("abc", 2)
+    assert cache.is_complete("abc")
+    assert list(cache.iter_pages("abc")) == [(0, "page 0 text", 2), (1, "page 1 text", 2)]
+    assert cache.layout("abc", 1) == {"blocks": [[0.0, 0.0, 10.0, 10.0, "page 1 text"]], "tables": []}
+    assert cache.layout("abc", 5) is None
+
+
+def test_forget_drops_one_file_version(tmp_path):
+    cache = PageCache(str(tmp_path / "pages.sqlite"))
+    for file_hash in ("old", "new"):
+        cache.put_pages(file_hash, [_record(0, total=1)])
+        cache.mark_complete(file_hash, 1)
+
+    cache.forget("old")
+    assert not cache.is_complete("old")
+    assert list(cache.iter_pages("old")) == []
+    assert cache.is_complete("new")
@@ -0,0 +1,53 @@
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+
+from rate_limit import CACHED_FLAG, AdaptiveRateLimiter, RateLimitCallbackHandler, is_rate_limit_error
+
+
+def _result(cached=False, tokens=100):
+    message = AIMessage(content="answer", usage_metadata={"input_tokens": tokens, "output_tokens": 0,
+                                                          "total_tokens": tokens})
+    info = {CACHED_FLAG: True} if cached else None
+    return LLMResult(generations=[[ChatGeneration(message=message, generation_info=info)]])
+
+
+def test_cache_hits_are_not_charged():
+    limiter = AdaptiveRateLimiter(tokens_per_minute=1000)
+    handler = RateLimitCallbackHandler(limiter)
+    limiter.penalize()
+    multiplier = limiter.multiplier
+
+    handler.on_llm_end(_result(cached=True, tokens=900))
+    assert limiter.tokens.tokens == 1000
+    assert limiter.multiplier == multiplier  # a cache hit says nothing about API health
+
+    handler.on_llm_end(_result(tokens=900))
+    assert limiter.tokens.tokens < 200
+    assert limiter.multiplier > multiplier
+
+
+def test_request_budget_blocks_and_counts_the_wait():
+    limiter = AdaptiveRateLimiter(requests_per_minute=600)  # one request per 0.1 s once the burst is spent
+    limiter.requests.tokens = 1.0
+    assert limiter.acquire(blocking=False)
+    assert not limiter.acquire(blocking=False)
+    assert limiter.acquire()
+    assert limiter.stats()["throttled_seconds"] > 0
+
+
+def test_quota_errors_back_off():
+    limiter = AdaptiveRateLimiter(requests_per_minute=60, base_cooldown=5.0)
+    handler = RateLimitCallbackHandler(limiter)
+    handler.on_llm_error(ValueError("bad prompt"))
+    assert limiter.penalties == 0
+
+    handler.on_llm_error(RuntimeError("429 Resource has been exhausted"))
+    assert limiter.penalties == 1
+    assert limiter.multiplier == 0.5
+    assert not limiter.acquire(blocking=False)  # cooling down
+
+
+def test_rate_limit_error_detection():
+    assert is_rate_limit_error(RuntimeError("HTTP 429"))
+    assert is_rate_limit_error(RuntimeError("Quota exceeded for metric"))
+    assert not is_rate_limit_error(RuntimeError("500 internal error"))
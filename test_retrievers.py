@@ -0,0 +1,35 @@
+import retrievers
+from catalog import Catalog, Filing
+from retrievers import RetrieverRegistry
+
+
+def _registry(tmp_path, monkeypatch):
+    monkeypatch.setattr(retrievers, "DATA_FOLDER", str(tmp_path))
+    filings = [Filing("apple", "aapl-2023.pdf", year=2023), Filing("apple", "aapl-2024.pdf", year=2024),
+               Filing("tesla", "tsla-2024.pdf", year=2024), Filing("nvidia", "nvda-2024.pdf", year=2024)]
+    for filing in filings[:3]:
+        (tmp_path / filing.file).write_bytes(b"%PDF")
+    registry = RetrieverRegistry(catalog=Catalog(filings))
+    updated = []
+    monkeypatch.setattr(registry, "_update_facts", lambda filing, path: updated.append(filing.file))
+    return registry, updated
+
+
+def test_refresh_facts_only_touches_the_requested_companies(tmp_path, monkeypatch):
+    registry, updated = _registry(tmp_path, monkeypatch)
+    registry.refresh_facts(["apple"])
+    assert updated == ["aapl-2023.pdf", "aapl-2024.pdf"]
+    registry.refresh_facts([])
+    assert updated == ["aapl-2023.pdf", "aapl-2024.pdf"]
+
+
+def test_refresh_facts_without_keys_covers_filings_that_exist(tmp_path, monkeypatch):
+    registry, updated = _registry(tmp_path, monkeypatch)
+    registry.refresh_facts()
+    assert updated == ["aapl-2023.pdf", "aapl-2024.pdf", "tsla-2024.pdf"]
+
+
+def test_registry_opens_nothing_on_construction(tmp_path, monkeypatch):
+    registry, _ = _registry(tmp_path, monkeypatch)
+    assert registry._embeddings is None and registry._retrievers == {}
+    assert sorted(registry) == ["apple", "tesla"]
@@ -0,0 +1,69 @@
+import numpy as np
+
+from routing import LocalRouter
+
+
+COMPANIES = ["apple", "tesla"]
+ALIASES = {"apple": ["AAPL", "iPhone", "Tim Cook"], "tesla": ["TSLA", "Elon Musk", "Cybertruck"]}
+
+
+class _Topics:
+    """Embeds a text by the topic words it contains, one dimension per topic."""
+
+    TOPICS = ["phone", "car", "board"]
+
+    def __init__(self):
+        self.queries = 0
+
+    def _embed(self, text):
+        return [float(topic in text.lower()) for topic in self.TOPICS]
+
+    def embed_query(self, text):
+        self.queries += 1
+        return self._embed(text)
+
+    def embed_documents(self, texts):
+        return [self._embed(t) for t in texts]
+
+
+def _router(model=None, **kwargs):
+    model = model or _Topics()
+    profiles = {"apple": "Apple designs the phone", "tesla": "Tesla builds the car"}
+    return LocalRouter(COMPANIES, lambda: model, aliases=ALIASES, profiles=profiles, **kwargs)
+
+
+def test_keys_and_aliases_route_without_embedding():
+    model = _Topics()
+    router = _router(model)
+
+    assert router.route("What was Apple's revenue?").targets == ["apple"]
+    assert router.route("How many Cybertruck units shipped?").targets == ["tesla"]
+    route = router.route("Compare TSLA margins with tim cook's comments")
+    assert route.targets == ["apple", "tesla"]  # catalog order, not question order
+    assert route.method == "keyword"
+    assert route.scores == {"apple": 1.0, "tesla": 1.0}
+    assert model.queries == 0
+
+
+def test_aliases_match_whole_words_only():
+    route = _router().route("Which pineapple suppliers are mentioned?")
+    assert route.method != "keyword"
+
+
+def test_all_companies_wording_routes_everywhere():
+    route = _router().route("Which of both reported higher net income?")
+    assert route.targets == COMPANIES
+    assert route.method == "all"
+
+
+def test_embedding_fallback_picks_the_closest_profile():
+    route = _router().route("How many cars were delivered?")
+    assert route.method == "embedding"
+    assert route.targets == ["tesla"]
+    assert np.isclose(route.scores["tesla"], 1.0)
+
+
+def test_unrelated_question_routes_nowhere():
+    route = _router().route("Who chairs the board?")
+    assert route.targets == []
+    assert route.method == "none"
@@ -0,0 +1,80 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import service
+from service import Overloaded, QueryService
+
+
+@pytest.fixture
+def slow_agent(monkeypatch):
+    """An agent that blocks until the test releases it, so every request is in flight at once."""
+    release = threading.Event()
+    calls = []
+
+    def agent(question):
+        calls.append(question)
+        release.wait(5)
+        return f"answer to {question}"
+
+    monkeypatch.setitem(service.AGENTS, "graph", agent)
+    return release, calls
+
+
+async def _burst(svc, questions, release):
+    tasks = [asyncio.ensure_future(svc.ask(q)) for q in questions]
+    await asyncio.sleep(0.05)
+    release.set()
+    return await asyncio.gather(*tasks, return_exceptions=True)
+
+
+@pytest.mark.parametrize("max_concurrency,max_queue", [(1, 1), (2, 3)])
+def test_simultaneous_burst_admits_exactly_concurrency_plus_queue(slow_agent, max_concurrency, max_queue):
+    release, calls = slow_agent
+    svc = QueryService(max_concurrency=max_concurrency, max_queue=max_queue, queue_timeout=5)
+    results = asyncio.run(_burst(svc, [f"question {i}" for i in range(10)], release))
+
+    answered = [r for r in results if isinstance(r, dict)]
+    rejected = [r for r in results if isinstance(r, Overloaded)]
+    assert len(answered) == max_concurrency + max_queue
+    assert len(rejected) == 10 - len(answered)
+    assert len(calls) == len(answered)
+    assert svc.counters["rejected"] == len(rejected)
+    assert svc.admitted == 0 and svc.running == 0 and svc.waiting == 0
+
+
+def test_identical_questions_coalesce_without_using_admission(slow_agent):
+    release, calls = slow_agent
+    svc = QueryService(max_concurrency=1, max_queue=0, queue_timeout=5)
+    results = asyncio.run(_burst(svc, ["What is Apple's revenue?", "  what is apple's   REVENUE? "] * 3, release))
+
+    assert all(isinstance(r, dict) for r in results)
+    assert len(calls) == 1
+    assert sum(r["coalesced"] for r in results) == 5
+
+
+def test_admission_frees_up_after_answers(slow_agent):
+    release, calls = slow_agent
+    release.set()
+    svc = QueryService(max_concurrency=1, max_queue=0, queue_timeout=5)
+
+    async def sequential():
+        return [await svc.ask(f"question {i}") for i in range(3)]
+
+    assert len(asyncio.run(sequential())) == 3
+    assert svc.admitted == 0
+
+
+def test_queued_question_times_out_with_overloaded(monkeypatch):
+    monkeypatch.setitem(service.AGENTS, "graph", lambda question: time.sleep(0.3) or "late")
+    svc = QueryService(max_concurrency=1, max_queue=1, queue_timeout=0.05)
+
+    async def two():
+        return await asyncio.gather(svc.ask("first"), svc.ask("second"), return_exceptions=True)
+
+    first, second = asyncio.run(two())
+    assert first["answer"] == "late"
+    assert isinstance(second, Overloaded)
+    assert svc.counters["timeouts"] == 1
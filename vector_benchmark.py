@@ -0,0 +1,114 @@
+import argparse
+import os
+import random
+import tempfile
+import time
+import numpy as np
+from langchain_chroma import Chroma
+from termcolor import colored
+
+from config import DB_FOLDER, RETRIEVER_K
+from evaluator import TEST_CASES
+from indexing import stored_id
+from instrumentation import percentile
+from mmap_store import MmapVectorStore
+from retrievers import RetrieverRegistry
+
+
+def load_collection(vectorstore, page_size=1000):
+    ids, vectors, texts, offset = [], [], [], 0
+    while True:
+        page = vectorstore.get(limit=page_size, offset=offset, include=["embeddings", "documents"])
+        if not len(page["ids"]):
+            break
+        ids.extend(page["ids"])
+        vectors.extend(page["embeddings"])
+        texts.extend(page["documents"])
+        offset += len(page["ids"])
+    return ids, np.asarray(vectors, dtype=np.float32), texts
+
+
+def sample_queries(texts, count, seed=0):
+    """Evaluator questions plus the opening sentence of randomly chosen chunks."""
+    queries = [test["question"] for test in TEST_CASES]
+    rng = random.Random(seed)
+    for text in rng.sample(texts, min(count, len(texts))):
+        queries.append(text.strip().split(". ")[0][:200])
+    return queries
+
+
+def exact_top_k(matrix, query_vectors, k):
+    normalized = matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+    scores = query_vectors @ normalized.T
+    return [list(np.argsort(-row)[:k]) for row in scores]
+
+
+def measure(search, query_vectors, truth_ids, k):
+    """Mean recall@k against exact search, and per-query search latency (embedding excluded)."""
+    recalls, latencies = [], []
+    for vector, truth in zip(query_vectors, truth_ids):
+        started = time.perf_counter()
+        found = search(vector.tolist(), k)
+        latencies.append(time.perf_counter() - started)
+        recalls.append(len(set(found) & set(truth)) / len(truth))
+    return {
+        "recall": sum(recalls) / len(recalls),
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+    }
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def benchmark_company(registry, key, k, sample, nprobes, dtypes):
+    registry.warm([key])  # builds/updates the Chroma collection if needed
+    persist_dir = os.path.join(DB_FOLDER, key)
+    embeddings = registry.embeddings()
+    chroma = Chroma(persist_directory=persist_dir, embedding_function=embeddings)
+    ids, matrix, texts = load_collection(chroma)
+    if not ids:
+        return []
+    queries = sample_queries(texts, sample)
+    query_vectors = np.asarray(embeddings.embed_documents(queries), dtype=np.float32)
+    unit_queries = query_vectors / np.linalg.norm(query_vectors, axis=1, keepdims=True)
+    truth = [[ids[i] for i in row] for row in exact_top_k(matrix, unit_queries, k)]
+
+    def chroma_search(vector, k):
+        return [stored_id(doc) for doc in chroma.similarity_search_by_vector(vector, k=k)]
+
+    rows = [("chroma (hnsw)", measure(chroma_search, query_vectors, truth, k), directory_size(persist_dir))]
+    with tempfile.TemporaryDirectory() as tmp:
+        for dtype in dtypes:
+            path = os.path.join(tmp, dtype)
+            store = MmapVectorStore.build(path, ids, matrix, texts, [{} for _ in ids], embeddings, dtype)
+            for nprobe in nprobes:
+                store.nprobe = nprobe or len(store.centroids)
+
+                def mmap_search(vector, k):
+                    return [doc.id for doc, _ in store.similarity_search_by_vector_with_score(vector, k)]
+
+                label = f"mmap {dtype} nprobe={store.nprobe}/{len(store.centroids)}"
+                rows.append((label, measure(mmap_search, query_vectors, truth, k), directory_size(path)))
+    # Chroma collections default to L2 distance on the raw vectors, so when the model's
+    # embeddings are not normalized part of its "misses" are a metric difference, not ANN error
+    print(colored(f"\n{key}: {len(ids)} chunks, {len(queries)} queries, recall@{k} vs exact float32 cosine search", "cyan"))
+    print(f"{'store':<32} {'recall':>8} {'p50 ms':>8} {'p95 ms':>8} {'disk MB':>8}")
+    for label, result, size in rows:
+        print(f"{label:<32} {result['recall']:>8.3f} {result['p50_ms']:>8.3f} {result['p95_ms']:>8.3f} "
+              f"{size / 1e6:>8.2f}")
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the mmap vector store with Chroma on recall@k and latency.")
+    parser.add_argument("--k", type=int, default=RETRIEVER_K)
+    parser.add_argument("--sample", type=int, default=200, help="chunk-derived queries added to the evaluator questions")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 0], help="IVF lists to scan (0 = all)")
+    parser.add_argument("--dtype", nargs="+", default=["int8", "float16"])
+    args = parser.parse_args()
+
+    registry = RetrieverRegistry()
+    for key in registry:
+        benchmark_company(registry, key, args.k, args.sample, args.nprobe, args.dtype)